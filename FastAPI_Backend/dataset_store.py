@@ -0,0 +1,494 @@
+"""
+Columnar recipe dataset store
+Writes the recipe dataset once as .npy arrays plus offset-encoded text blobs and
+memory-maps it at startup, so processes share the pages instead of each parsing
+the gzipped CSV into its own DataFrame. The store can also be built from the CSV
+in chunks, so that only the numeric columns are ever held in memory.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+NUTRITION_COLUMNS = ['Calories', 'FatContent', 'SaturatedFatContent', 'CholesterolContent', 'SodiumContent',
+                     'CarbohydrateContent', 'FiberContent', 'SugarContent', 'ProteinContent']
+# R-style c("...", "...") columns, parsed into lists once when the store is built
+LIST_COLUMNS = ['RecipeIngredientParts', 'RecipeInstructions']
+STORE_DIRNAME = 'dataset_store'
+STORE_VERSION = 2
+# Explicit dtypes for chunked CSV ingestion; other columns are typed from the first chunk
+CSV_DTYPES = dict({name: 'float64' for name in NUTRITION_COLUMNS}, RecipeId='int64', Name=object, CookTime=object,
+                  PrepTime=object, TotalTime=object, RecipeIngredientParts=object, RecipeInstructions=object,
+                  Cuisine=object)
+# Rows per chunk; on the 20k-recipe sample 2000 halves the ingestion peak of 20000 at the same speed
+DEFAULT_CHUNKSIZE = 2000
+# Where chunked ingestion puts the store when the data directory is read-only; reused across process starts
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', tempfile.gettempdir())
+
+
+def extract_quoted_strings(s):
+    # Find all the strings inside double quotes
+    return re.findall(r'"([^"]*)"', s) if isinstance(s, str) else []
+
+
+class TextColumn:
+    """
+    Strings stored as one UTF-8 blob plus int64 offsets (and an optional null mask).
+    Row i is blob[offsets[i]:offsets[i+1]], decoded only when it is asked for.
+    """
+
+    def __init__(self, offsets, blob, nulls=None):
+        self.offsets = offsets
+        self.blob = blob
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return np.nan
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __getitem__(self, rows):
+        if np.isscalar(rows):
+            return self.get(rows)
+        values = np.empty(len(rows), dtype=object)
+        for position, i in enumerate(rows):
+            values[position] = self.get(i)
+        return values
+
+    @staticmethod
+    def write(prefix, values):
+        """Write an iterable of strings (None/NaN for missing) to prefix.offsets.npy, prefix.blob and prefix.nulls.npy."""
+        writer = TextColumnWriter(prefix)
+        writer.append(values)
+        writer.close()
+
+    @classmethod
+    def open(cls, prefix, mmap=True):
+        mmap_mode = 'r' if mmap else None
+        offsets = np.load(prefix + '.offsets.npy', mmap_mode=mmap_mode)
+        if offsets[-1] == 0:
+            blob = np.empty(0, dtype=np.uint8)  # np.memmap refuses empty files
+        elif mmap:
+            blob = np.memmap(prefix + '.blob', dtype=np.uint8, mode='r')
+        else:
+            blob = np.fromfile(prefix + '.blob', dtype=np.uint8)
+        nulls = np.load(prefix + '.nulls.npy') if os.path.exists(prefix + '.nulls.npy') else None
+        return cls(offsets, blob, nulls)
+
+
+class ArrayFileWriter:
+    """
+    Appends batches of one dtype to a raw temporary file and turns it into path (.npy) on close,
+    so arrays with one entry per item never accumulate in memory while a column is streamed.
+    """
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.file = open(path + '.tmp', 'wb')
+        self.count = 0
+
+    def append(self, values):
+        values = np.asarray(values, dtype=self.dtype)
+        values.tofile(self.file)
+        self.count += len(values)
+
+    def close(self, save=True):
+        """Write the .npy (unless save is False) and remove the temporary file."""
+        self.file.close()
+        if save:
+            data = np.memmap(self.path + '.tmp', dtype=self.dtype, mode='r') if self.count else np.empty(0, self.dtype)
+            np.save(self.path, data)
+            del data  # unmapped before the file is removed
+        os.remove(self.path + '.tmp')
+
+
+class TextColumnWriter:
+    """Writes a TextColumn incrementally, one batch of values at a time; offsets and nulls are streamed to disk."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.blob = open(prefix + '.blob', 'wb')
+        self.offsets = ArrayFileWriter(prefix + '.offsets.npy', np.int64)
+        self.offsets.append([0])
+        self.nulls = ArrayFileWriter(prefix + '.nulls.npy', bool)
+        self.size = 0
+        self.has_nulls = False
+
+    def __len__(self):
+        return self.nulls.count
+
+    def append(self, values):
+        lengths, nulls = [], []
+        for value in values:
+            missing = value is None or (isinstance(value, float) and np.isnan(value))
+            nulls.append(missing)
+            lengths.append(0 if missing else self.blob.write(str(value).encode('utf-8')))
+        if not nulls:
+            return
+        offsets = self.size + np.cumsum(lengths, dtype=np.int64)
+        self.size = int(offsets[-1])
+        self.offsets.append(offsets)
+        self.nulls.append(nulls)
+        self.has_nulls = self.has_nulls or any(nulls)
+
+    def close(self):
+        self.blob.close()
+        self.offsets.close()
+        self.nulls.close(save=self.has_nulls)
+
+
+class ListColumnWriter:
+    """Writes a ListColumn incrementally from batches of lists."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.offsets = ArrayFileWriter(prefix + '.rows.npy', np.int64)
+        self.offsets.append([0])
+        self.items = TextColumnWriter(prefix + '.items')
+
+    def append(self, lists):
+        lists = list(lists)
+        counts = [len(values) for values in lists]
+        self.offsets.append(len(self.items) + np.cumsum(counts, dtype=np.int64))
+        self.items.append(item for values in lists for item in values)
+
+    def close(self):
+        self.offsets.close()
+        self.items.close()
+
+
+class ListColumn:
+    """
+    A list of strings per row: int64 row offsets into one flat items column.
+    Row i is items[offsets[i]:offsets[i+1]]; items is a TextColumn or an object array.
+    """
+
+    def __init__(self, offsets, items):
+        self.offsets = offsets
+        self.items = items
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return list(self.items[np.arange(start, end)] if isinstance(self.items, TextColumn) else self.items[start:end])
+
+    def __getitem__(self, rows):
+        if np.isscalar(rows):
+            return self.get(rows)
+        values = np.empty(len(rows), dtype=object)
+        for position, i in enumerate(rows):
+            values[position] = self.get(i)
+        return values
+
+    @classmethod
+    def from_lists(cls, lists):
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(values) for values in lists], out=offsets[1:])
+        items = np.array([item for values in lists for item in values], dtype=object)
+        return cls(offsets, items)
+
+    def write(self, prefix):
+        np.save(prefix + '.rows.npy', np.asarray(self.offsets, dtype=np.int64))
+        TextColumn.write(prefix + '.items', self.items[np.arange(len(self.items))] if isinstance(self.items, TextColumn) else self.items)
+
+    @classmethod
+    def open(cls, prefix, mmap=True):
+        offsets = np.load(prefix + '.rows.npy', mmap_mode='r' if mmap else None)
+        return cls(offsets, TextColumn.open(prefix + '.items', mmap=mmap))
+
+
+class RecipeStore:
+    """
+    Recipe dataset held as columns: an (n, 9) float64 nutrition matrix, numeric arrays, text columns
+    and the ingredient/instruction list columns.
+    Built in memory from a DataFrame, streamed from a CSV by build_from_csv(), or opened memory-mapped
+    from a directory written by either.
+    """
+
+    def __init__(self, columns, nutrition, path=None):
+        self.columns = columns  # name -> np.ndarray, TextColumn or ListColumn, in the original column order
+        self.nutrition = nutrition
+        self.path = path
+        self._id_order = None
+        self._fingerprint = None
+
+    def __len__(self):
+        return self.nutrition.shape[0]
+
+    @property
+    def column_names(self):
+        names = []
+        for name in self.columns:
+            if name == 'nutrition':
+                names.extend(NUTRITION_COLUMNS)
+            else:
+                names.append(name)
+        return names
+
+    @classmethod
+    def from_dataframe(cls, dataframe):
+        columns = {}
+        for name in dataframe.columns:
+            if name in NUTRITION_COLUMNS:
+                columns.setdefault('nutrition', None)
+            elif name in LIST_COLUMNS:
+                columns[name] = ListColumn.from_lists(dataframe[name].map(extract_quoted_strings).tolist())
+            elif pd.api.types.is_numeric_dtype(dataframe[name]):
+                columns[name] = dataframe[name].to_numpy()
+            else:
+                columns[name] = dataframe[name].to_numpy(dtype=object)
+        nutrition = np.ascontiguousarray(dataframe[NUTRITION_COLUMNS].to_numpy(dtype=np.float64))
+        return cls(columns, nutrition)
+
+    @classmethod
+    def build_from_csv(cls, csv_path, path, chunksize=DEFAULT_CHUNKSIZE, compression='gzip', derived=None):
+        """
+        Write a store for csv_path to directory path reading chunksize rows at a time: text and list columns
+        are streamed to disk as they are parsed and only the numeric columns are accumulated in memory.
+        derived maps extra numeric column names to functions of a chunk (with its list columns parsed)
+        returning one value per row, so per-recipe columns such as cost estimates are stored too.
+        """
+        os.makedirs(path, exist_ok=True)
+        manifest = {'version': STORE_VERSION, 'n_rows': 0, 'columns': []}
+        numeric, writers, nutrition = {}, {}, []
+        derived = derived or {}
+        for chunk in pd.read_csv(csv_path, compression=compression, chunksize=chunksize, dtype=CSV_DTYPES):
+            if not manifest['columns']:
+                for name in chunk.columns:
+                    if name in NUTRITION_COLUMNS:
+                        if name == next(column for column in chunk.columns if column in NUTRITION_COLUMNS):
+                            manifest['columns'].append({'name': 'nutrition', 'kind': 'nutrition'})
+                    elif name in LIST_COLUMNS:
+                        writers[name] = ListColumnWriter(os.path.join(path, name))
+                        manifest['columns'].append({'name': name, 'kind': 'list'})
+                    elif CSV_DTYPES.get(name) != object and pd.api.types.is_numeric_dtype(chunk[name]):
+                        numeric[name] = []
+                        manifest['columns'].append({'name': name, 'kind': 'numeric'})
+                    else:
+                        writers[name] = TextColumnWriter(os.path.join(path, name))
+                        manifest['columns'].append({'name': name, 'kind': 'text'})
+                for name in derived:
+                    if name not in numeric:
+                        numeric[name] = []
+                        manifest['columns'].append({'name': name, 'kind': 'numeric'})
+            chunk = chunk.assign(**{name: chunk[name].map(extract_quoted_strings)
+                                    for name in LIST_COLUMNS if name in chunk.columns})
+            nutrition.append(chunk[NUTRITION_COLUMNS].to_numpy(dtype=np.float64))
+            for name, arrays in numeric.items():
+                arrays.append(np.asarray(derived[name](chunk)) if name in derived else chunk[name].to_numpy())
+            for name, writer in writers.items():
+                if name in LIST_COLUMNS:
+                    writer.append(chunk[name])
+                else:
+                    writer.append(chunk[name].to_numpy(dtype=object))
+            manifest['n_rows'] += len(chunk)
+        for writer in writers.values():
+            writer.close()
+        np.save(os.path.join(path, 'nutrition.npy'), np.concatenate(nutrition) if nutrition else np.empty((0, len(NUTRITION_COLUMNS))))
+        for name, arrays in numeric.items():
+            np.save(os.path.join(path, name + '.npy'), np.concatenate(arrays))
+        # Written last so a half-written store is never picked up
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return cls.open(path)
+
+    def save(self, path):
+        """Write the store to directory path (created if needed)."""
+        os.makedirs(path, exist_ok=True)
+        manifest = {'version': STORE_VERSION, 'n_rows': len(self), 'columns': []}
+        for name, column in self.columns.items():
+            if name == 'nutrition':
+                np.save(os.path.join(path, 'nutrition.npy'), self.nutrition)
+                manifest['columns'].append({'name': name, 'kind': 'nutrition'})
+            elif isinstance(column, ListColumn):
+                column.write(os.path.join(path, name))
+                manifest['columns'].append({'name': name, 'kind': 'list'})
+            elif isinstance(column, TextColumn) or column.dtype == object:
+                TextColumn.write(os.path.join(path, name), column[np.arange(len(self))] if isinstance(column, TextColumn) else column)
+                manifest['columns'].append({'name': name, 'kind': 'text'})
+            else:
+                np.save(os.path.join(path, name + '.npy'), column)
+                manifest['columns'].append({'name': name, 'kind': 'numeric'})
+        # Written last so a half-written store is never picked up
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def open(cls, path, mmap=True, resident=()):
+        """
+        Open a store written by save(); with mmap the arrays stay on disk and are paged in on demand.
+        Numeric columns named in resident ('nutrition' for the matrix) are read into memory regardless.
+        """
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['version'] != STORE_VERSION:
+            raise ValueError(f"Unsupported dataset store version {manifest['version']} in {path}, "
+                             "rebuild it with build_dataset_store.py")
+        mmap_mode = 'r' if mmap else None
+        columns = {}
+        nutrition = None
+        for column in manifest['columns']:
+            name, kind = column['name'], column['kind']
+            if kind == 'nutrition':
+                nutrition = np.load(os.path.join(path, 'nutrition.npy'), mmap_mode=None if name in resident else mmap_mode)
+                columns[name] = None
+            elif kind == 'text':
+                columns[name] = TextColumn.open(os.path.join(path, name), mmap=mmap)
+            elif kind == 'list':
+                columns[name] = ListColumn.open(os.path.join(path, name), mmap=mmap)
+            else:
+                columns[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode=None if name in resident else mmap_mode)
+        return cls(columns, nutrition, path)
+
+    def column(self, name):
+        """A full column as a pandas Series."""
+        if name in NUTRITION_COLUMNS:
+            return pd.Series(self.nutrition[:, NUTRITION_COLUMNS.index(name)], name=name)
+        column = self.columns[name]
+        if isinstance(column, (TextColumn, ListColumn)):
+            column = column[np.arange(len(self))]
+        return pd.Series(column, name=name)
+
+    def take(self, rows, columns=None):
+        """
+        DataFrame of the given row positions, in the original column order.
+        columns restricts it to a subset so callers that only need a few fields skip decoding the rest.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        wanted = None if columns is None else set(columns)
+        data = {}
+        for name, column in self.columns.items():
+            if name == 'nutrition':
+                values = self.nutrition[rows]
+                for j, nutrition_column in enumerate(NUTRITION_COLUMNS):
+                    if wanted is None or nutrition_column in wanted:
+                        data[nutrition_column] = values[:, j]
+            elif wanted is None or name in wanted:
+                data[name] = column[rows]
+        return pd.DataFrame(data, index=rows)
+
+    def rows_for_ids(self, ids):
+        """Row positions of the given RecipeIds (-1 for unknown ids)."""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.columns['RecipeId'], kind='stable')
+        recipe_ids = self.columns['RecipeId']
+        ids = np.asarray(ids, dtype=recipe_ids.dtype)
+        positions = np.searchsorted(recipe_ids, ids, sorter=self._id_order)
+        rows = self._id_order[np.minimum(positions, len(self) - 1)] if len(self) else np.zeros(len(ids), dtype=np.int64)
+        return np.where((positions < len(self)) & (recipe_ids[rows] == ids), rows, -1)
+
+    def take_ids(self, ids, columns=None):
+        """take() by RecipeId, e.g. to fetch the text of a few recipes from disk on demand."""
+        rows = self.rows_for_ids(ids)
+        if (rows < 0).any():
+            raise KeyError(f"Unknown RecipeId(s): {list(np.asarray(ids)[rows < 0])}")
+        return self.take(rows, columns)
+
+    def fingerprint(self):
+        """
+        Short hash of an on-disk store's build: its column files' names, sizes and modification times,
+        manifest included. Derived arrays saved under it are never reused for a rebuilt or rewritten
+        store, even one with the same number of rows. None for an in-memory store.
+        """
+        if self.path is None:
+            return None
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            for entry in sorted(os.scandir(self.path), key=lambda entry: entry.name):
+                if entry.is_file():
+                    stat = entry.stat()
+                    digest.update(f'{entry.name}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+    def save_array(self, name, array):
+        """
+        Persist a derived array (e.g. an index structure) next to the columns of an on-disk store.
+        The file is replaced atomically, so processes building the same array concurrently never see a partial one.
+        Raises OSError when the store is not writable; callers keep their in-memory copy then.
+        """
+        if self.path is None:
+            raise ValueError("save_array needs a store opened from disk")
+        path = os.path.join(self.path, name + '.npy')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # e.g. a full disk: leave no partial temporary file behind
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load_array(self, name, mmap=True):
+        """A derived array saved with save_array(), memory-mapped, or None when absent."""
+        if self.path is None or not os.path.exists(os.path.join(self.path, name + '.npy')):
+            return None
+        return np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r' if mmap else None)
+
+
+def store_path(data_dir):
+    return os.path.join(data_dir, STORE_DIRNAME)
+
+
+def cached_store_path(csv_path):
+    """Store directory under CACHE_DIR for csv_path, named after its path, size and modification time."""
+    stat = os.stat(csv_path)
+    key = f'{os.path.abspath(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    return os.path.join(CACHE_DIR, f"dataset_store_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}")
+
+
+def build_store_once(csv_path, path, chunksize, derived=None):
+    """
+    Ingest csv_path into a store at path unless one is already there. The store is written to a
+    private directory and renamed into place, so concurrent processes never share a half-written one.
+    """
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        RecipeStore.build_from_csv(csv_path, tmp_path, chunksize=chunksize, derived=derived)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process finished first (or a stale directory is in the way); keep theirs
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, 'manifest.json')):
+                raise
+    return RecipeStore.open(path, mmap=True, resident=('nutrition', 'RecipeId'))
+
+
+def load_dataset(data_dir, csv_names=('dataset_enhanced.csv', 'dataset.csv'), mmap=True, chunksize=None, derived=None):
+    """
+    Load the recipe dataset from data_dir, preferring the memory-mapped store
+    and falling back to parsing the gzipped CSV into memory.
+    With chunksize (or the DATASET_CHUNKSIZE environment variable) the CSV is instead ingested in chunks
+    into a store in data_dir (or, when that is read-only, one under CACHE_DIR that later starts reuse),
+    keeping only the nutrition matrix and ids resident and fetching text from disk on demand.
+    derived columns (see RecipeStore.build_from_csv) are written into that store.
+    """
+    chunksize = chunksize or int(os.environ.get('DATASET_CHUNKSIZE', 0)) or None
+    path = store_path(data_dir)
+    if os.path.exists(os.path.join(path, 'manifest.json')):
+        return RecipeStore.open(path, mmap=mmap)
+    for csv_name in csv_names:
+        csv_path = os.path.join(data_dir, csv_name)
+        if os.path.exists(csv_path):
+            if chunksize:
+                if not os.access(data_dir, os.W_OK):
+                    path = cached_store_path(csv_path)
+                return build_store_once(csv_path, path, chunksize, derived)
+            return RecipeStore.from_dataframe(pd.read_csv(csv_path, compression='gzip'))
+    raise FileNotFoundError(f"No dataset store or CSV found in {data_dir}")
@@ -1,23 +1,46 @@
 from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List,Optional, Annotated
-import pandas as pd
-from model import recommend,output_recommended_recipes
+from pydantic import BaseModel,Field
+from typing import Dict,List,Optional, Annotated, Literal
+from model import recommend,recommend_batch,output_recommended_recipes,get_index
+from dataset_store import load_dataset
+from result_cache import ResultCache
+from shopping_list_generator import RecipeCostTable
 
 
-dataset=pd.read_csv('../Data/dataset.csv',compression='gzip')
+# Memory-maps ../Data/dataset_store when it has been built, otherwise parses the gzipped CSV
+dataset=load_dataset('../Data',csv_names=('dataset.csv',))
+# Per-recipe cost estimates for max_cost requests, unless build_dataset_store.py already stored them
+if 'EstimatedCost' not in dataset.columns:
+    dataset.columns['EstimatedCost']=RecipeCostTable(dataset.column('RecipeIngredientParts')).costs
+# Fit the scaler and nearest-neighbour model once at startup, not per request; with a store on disk the
+# fitted arrays are saved there once and every worker process memory-maps the same copy
+get_index(dataset)
+
+# Serialised outputs of recent requests, keyed on the rounded nutrition input, ingredients and params
+# (budget and price overrides included)
+result_cache=ResultCache()
+cache_miss=object()
 
 app = FastAPI()
 
 
 class params(BaseModel):
-    n_neighbors:int=5
+    n_neighbors:int=Field(5,gt=0)
     return_distance:bool=False
+    # Search backend ('exact' brute force or 'ivf' approximate, default from RECIPE_SEARCH_BACKEND) and IVF lists to scan
+    backend:Optional[Literal['exact','ivf']]=None
+    n_probe:Optional[int]=Field(None,gt=0)
+    # Only recipes whose estimated cost (USD, under the optional ingredient price overrides) is at most max_cost
+    max_cost:Optional[float]=Field(None,ge=0)
+    price_database:Optional[Dict[str,float]]=None
+
+# The params field of PredictionIn shadows the class name in its namespace, where pydantic resolves annotations
+request_params_model=params
 
 class PredictionIn(BaseModel):
     nutrition_input:List[float]
     ingredients:list[str]=[]
-    params:Optional[params]
+    params:Optional[request_params_model]=None
 
 
 class Recipe(BaseModel):
@@ -36,10 +59,17 @@ class Recipe(BaseModel):
     SugarContent:float
     ProteinContent:float
     RecipeInstructions:list[str]
+    EstimatedCost:Optional[float]=None
 
 class PredictionOut(BaseModel):
     output: Optional[List[Recipe]] = None
 
+class BatchPredictionIn(BaseModel):
+    items:List[PredictionIn]
+
+class BatchPredictionOut(BaseModel):
+    output: List[Optional[List[Recipe]]] = []
+
 
 @app.get("/")
 def home():
@@ -48,10 +78,36 @@ def home():
 
 @app.post("/predict/",response_model=PredictionOut)
 def update_item(prediction_input:PredictionIn):
-    recommendation_dataframe=recommend(dataset,prediction_input.nutrition_input,prediction_input.ingredients,prediction_input.params.dict())
-    output=output_recommended_recipes(recommendation_dataframe)
+    request_params=(prediction_input.params or params()).dict()
+    key=result_cache.key(prediction_input.nutrition_input,prediction_input.ingredients,request_params)
+    output=result_cache.get_or_compute(key,lambda:output_recommended_recipes(
+        recommend(dataset,prediction_input.nutrition_input,prediction_input.ingredients,request_params)))
     if output is None:
         return {"output":None}
     else:
         return {"output":output}
 
+
+@app.post("/predict/batch",response_model=BatchPredictionOut)
+def update_items(batch_input:BatchPredictionIn):
+    items=batch_input.items
+    params_list=[(item.params or params()).dict() for item in items]
+    keys=[result_cache.key(item.nutrition_input,item.ingredients,item_params) for item,item_params in zip(items,params_list)]
+    outputs=[result_cache.get(key,cache_miss) for key in keys]
+    # Only the items not answered from the cache are searched, in one batch
+    missing=[i for i,output in enumerate(outputs) if output is cache_miss]
+    if missing:
+        recommendation_dataframes=recommend_batch(dataset,
+                                                  [items[i].nutrition_input for i in missing],
+                                                  [items[i].ingredients for i in missing],
+                                                  [params_list[i] for i in missing])
+        for i,recommendation_dataframe in zip(missing,recommendation_dataframes):
+            outputs[i]=output_recommended_recipes(recommendation_dataframe)
+            result_cache.put(keys[i],outputs[i])
+    return {"output":outputs}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and size of the result cache."""
+    return result_cache.stats()
@@ -1,64 +1,39 @@
-import numpy as np
-import re
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import FunctionTransformer
-
-
-def scaling(dataframe):
-    scaler=StandardScaler()
-    prep_data=scaler.fit_transform(dataframe.iloc[:,6:15].to_numpy())
-    return prep_data,scaler
-
-def nn_predictor(prep_data):
-    neigh = NearestNeighbors(metric='cosine',algorithm='brute')
-    neigh.fit(prep_data)
-    return neigh
-
-def build_pipeline(neigh,scaler,params):
-    transformer = FunctionTransformer(neigh.kneighbors,kw_args=params)
-    pipeline=Pipeline([('std_scaler',scaler),('NN',transformer)])
-    return pipeline
-
-def extract_data(dataframe,ingredients):
-    extracted_data=dataframe.copy()
-    extracted_data=extract_ingredient_filtered_data(extracted_data,ingredients)
-    return extracted_data
-    
-def extract_ingredient_filtered_data(dataframe,ingredients):
-    extracted_data=dataframe.copy()
-    regex_string=''.join(map(lambda x:f'(?=.*{x})',ingredients))
-    extracted_data=extracted_data[extracted_data['RecipeIngredientParts'].str.contains(regex_string,regex=True,flags=re.IGNORECASE)]
-    return extracted_data
-
-def apply_pipeline(pipeline,_input,extracted_data):
-    _input=np.array(_input).reshape(1,-1)
-    return extracted_data.iloc[pipeline.transform(_input)[0]]
-
-def recommend(dataframe,_input,ingredients=[],params={'n_neighbors':5,'return_distance':False}):
-        extracted_data=extract_data(dataframe,ingredients)
-        if extracted_data.shape[0]>=params['n_neighbors']:
-            prep_data,scaler=scaling(extracted_data)
-            neigh=nn_predictor(prep_data)
-            pipeline=build_pipeline(neigh,scaler,params)
-            return apply_pipeline(pipeline,_input,extracted_data)
+from recipe_index import get_index
+from shopping_list_generator import budget_mask
+
+def recommend(dataset,_input,ingredients=[],params={'n_neighbors':5,'return_distance':False}):
+        """Nearest recipes as a DataFrame, or None; with params['max_cost'] only recipes within it, possibly fewer."""
+        index=get_index(dataset)
+        candidates=index.ingredient_index.lookup(ingredients)
+        n_candidates=len(index) if candidates is None else len(candidates)
+        if n_candidates>=params['n_neighbors']:
+            return dataset.take(index.search(_input,params['n_neighbors'],candidates,allowed=budget_mask(dataset,params),
+                                              backend=params.get('backend'),n_probe=params.get('n_probe')))
         else:
             return None
 
-def extract_quoted_strings(s):
-    # Find all the strings inside double quotes
-    strings = re.findall(r'"([^"]*)"', s)
-    # Join the strings with 'and'
-    return strings
+def recommend_batch(dataset,inputs,ingredients_list,params_list):
+    """Batched recommend(): one DataFrame (or None when too few recipes match) per nutrition input."""
+    index=get_index(dataset)
+    candidates=[index.ingredient_index.lookup(ingredients) for ingredients in ingredients_list]
+    n_neighbors=[params['n_neighbors'] for params in params_list]
+    answerable=[i for i,(rows,k) in enumerate(zip(candidates,n_neighbors)) if (len(index) if rows is None else len(rows))>=k]
+    output=[None]*len(inputs)
+    # Queries asking for the same backend and knobs are searched together
+    groups={}
+    for i in answerable:
+        groups.setdefault((params_list[i].get('backend'),params_list[i].get('n_probe')),[]).append(i)
+    for (backend,n_probe),members in groups.items():
+        positions=index.search_batch([inputs[i] for i in members],[n_neighbors[i] for i in members],[candidates[i] for i in members],
+                                     allowed=[budget_mask(dataset,params_list[i]) for i in members],backend=backend,n_probe=n_probe)
+        for i,rows in zip(members,positions):
+            output[i]=dataset.take(rows)
+    return output
 
 def output_recommended_recipes(dataframe):
+    # Ingredient and instruction columns are already lists, parsed once when the dataset was loaded
     if dataframe is not None:
-        output=dataframe.copy()
-        output=output.to_dict("records")
-        for recipe in output:
-            recipe['RecipeIngredientParts']=extract_quoted_strings(recipe['RecipeIngredientParts'])
-            recipe['RecipeInstructions']=extract_quoted_strings(recipe['RecipeInstructions'])
+        output=dataframe.to_dict("records")
     else:
         output=None
     return output
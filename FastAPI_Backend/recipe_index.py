@@ -0,0 +1,418 @@
+"""
+Recipe search index
+Scaled nutrition vectors, the ingredient inverted index and the search backends shared by the
+FastAPI backend and the Streamlit app. For an on-disk dataset store the fitted arrays are saved
+under a directory keyed on the store's fingerprint, so every process memory-maps the same copy
+and a rebuilt store never picks up vectors of the previous build.
+"""
+
+import os
+import re
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+
+def scaling(dataset):
+    scaler = StandardScaler()
+    prep_data = scaler.fit_transform(dataset.nutrition)
+    return prep_data, scaler
+
+
+def scaler_from_arrays(mean, scale, var, n_samples_seen):
+    """A fitted StandardScaler rebuilt from saved parameters, without refitting."""
+    scaler = StandardScaler()
+    scaler.mean_, scaler.scale_, scaler.var_ = mean, scale, var
+    scaler.n_samples_seen_ = int(n_samples_seen[0])
+    scaler.n_features_in_ = len(mean)
+    return scaler
+
+
+def top_k(distances, k):
+    """Positions of the k smallest distances, closest first, without a full sort."""
+    assert k >= 1, f"k must be at least 1, got {k}"
+    if k < len(distances):
+        nearest = np.argpartition(distances, k - 1)[:k]
+    else:
+        nearest = np.arange(len(distances))
+    return nearest[np.argsort(distances[nearest], kind='stable')]
+
+
+def top_k_allowed(distances, k, allowed):
+    """
+    top_k() restricted to the positions where the boolean mask allowed holds (fewer if not enough do).
+    The partition widens geometrically until k allowed positions are found, instead of guessing an over-fetch.
+    """
+    width = k
+    while True:
+        nearest = top_k(distances, width)
+        nearest = nearest[allowed[nearest]]
+        if len(nearest) >= k or width >= len(distances):
+            return nearest[:k]
+        width *= 4
+
+
+def normalize_token(token):
+    """Reduce a lowercase ingredient word to a crude singular form."""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 4 and token.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def tokenize_ingredient(text):
+    return [normalize_token(word) for word in re.findall(r'[a-z]+', text.lower())]
+
+
+# Saved index arrays live in INDEX_DIR_PREFIX + the store fingerprint; directories of other builds are stale
+INDEX_DIR_PREFIX = 'index_'
+# Directories written before the arrays were keyed on the fingerprint
+LEGACY_INDEX_DIRS = ('recipe_index', 'ingredient_index')
+
+
+def index_array_name(dataset, name):
+    """save_array()/load_array() name of an index array for the current build of dataset."""
+    return f'{INDEX_DIR_PREFIX}{dataset.fingerprint()}/{name}'
+
+
+def remove_stale_indexes(dataset):
+    """
+    Delete the index arrays saved for earlier builds of an on-disk store. Best effort: a directory that
+    cannot be removed (e.g. still memory-mapped on Windows) is left for the next start.
+    """
+    current = index_array_name(dataset, '').rstrip('/')
+    for entry in os.scandir(dataset.path):
+        if entry.is_dir() and entry.name != current and (entry.name.startswith(INDEX_DIR_PREFIX)
+                                                         or entry.name in LEGACY_INDEX_DIRS):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class IngredientIndex:
+    """
+    Inverted index from ingredient word to the sorted row positions of the recipes using it.
+    Built from the parsed ingredient lists; matches whole words, so "egg" finds "eggs" but not "eggplant".
+    """
+    def __init__(self, ingredient_lists):
+        words = ingredient_lists.str.join(' ').str.lower().str.findall(r'[a-z]+')
+        words = words.reset_index(drop=True).explode().dropna()
+        rows = words.index.to_numpy(dtype=np.int64)
+        codes, vocabulary = pd.factorize(words)
+        # Normalise the vocabulary once instead of every occurrence, then merge codes that collapse together
+        normalized_codes, tokens = pd.factorize(pd.Series([normalize_token(word) for word in vocabulary], dtype=object))
+        codes = normalized_codes[codes]
+        n_rows = len(ingredient_lists)
+        pairs = np.unique(codes.astype(np.int64) * n_rows + rows)
+        codes, rows = np.divmod(pairs, n_rows)
+        boundaries = np.flatnonzero(np.diff(codes)) + 1
+        self.postings = {tokens[code]: posting.astype(np.int32)
+                         for code, posting in zip(codes[np.r_[0, boundaries]], np.split(rows, boundaries))} if len(pairs) else {}
+
+    @classmethod
+    def from_arrays(cls, tokens, offsets, rows):
+        """Rebuild from the flat arrays of save(); postings are views into rows, nothing is copied."""
+        index = cls.__new__(cls)
+        index.postings = {str(token): rows[offsets[i]:offsets[i + 1]] for i, token in enumerate(tokens)}
+        return index
+
+    @classmethod
+    def load(cls, dataset):
+        arrays = [dataset.load_array(index_array_name(dataset, f'ingredients/{name}'))
+                  for name in ('tokens', 'offsets', 'rows')]
+        if any(array is None for array in arrays):
+            return None
+        return cls.from_arrays(*arrays)
+
+    def save(self, dataset):
+        """Store the postings as flat token/offset/row arrays alongside an on-disk dataset."""
+        tokens = sorted(self.postings)
+        lengths = [len(self.postings[token]) for token in tokens]
+        dataset.save_array(index_array_name(dataset, 'ingredients/tokens'), np.array(tokens, dtype=str))
+        dataset.save_array(index_array_name(dataset, 'ingredients/offsets'),
+                           np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]))
+        dataset.save_array(index_array_name(dataset, 'ingredients/rows'),
+                           np.concatenate([self.postings[token] for token in tokens]) if tokens else np.empty(0, dtype=np.int32))
+
+    def lookup(self, ingredients):
+        """Sorted row positions of the recipes containing every ingredient, each matched word by word."""
+        postings = []
+        for ingredient in ingredients:
+            tokens = tokenize_ingredient(ingredient)
+            if not tokens:
+                continue
+            for token in tokens:
+                posting = self.postings.get(token)
+                if posting is None:
+                    return np.empty(0, dtype=np.int32)
+                postings.append(posting)
+        if not postings:
+            return None
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            result = np.intersect1d(result, posting, assume_unique=True)
+            if not len(result):
+                break
+        return result
+
+
+class ExactBackend:
+    """Brute-force search: every row, or every filtered candidate, is scored, so results are exact."""
+    approximate = False
+
+    def __init__(self, index):
+        self.index = index
+
+    def candidates(self, query, candidates=None, n_probe=None):
+        return candidates
+
+
+# IVF knobs when not given per request: number of lists (default about sqrt(rows)) and lists scanned per query
+IVF_LISTS = int(os.environ.get('IVF_LISTS', 0)) or None
+IVF_PROBES = int(os.environ.get('IVF_PROBES', 8))
+
+
+class IVFBackend:
+    """
+    Approximate inverted-file search. Rows are clustered by spherical k-means over the normalized scaled
+    nutrition vectors and a query only scores the rows of its n_probe closest clusters, then ranks them exactly.
+    More lists make each one shorter, more probes raise recall; n_probe equal to the number of lists is exact.
+    The lists are saved next to an on-disk dataset like the other index arrays.
+    """
+    approximate = True
+
+    def __init__(self, index, n_lists=IVF_LISTS, n_probe=IVF_PROBES, n_iter=10, seed=0):
+        self.index = index
+        self.n_lists = min(n_lists or max(1, int(np.sqrt(len(index)))), len(index))
+        self.n_probe = n_probe
+        dataset = index.dataset
+        names = [index_array_name(dataset, f'ivf_{self.n_lists}/{part}') for part in ('centroids', 'offsets', 'rows')]
+        arrays = [dataset.load_array(name) for name in names]
+        if any(array is None for array in arrays) or arrays[2].shape[0] != len(index):
+            arrays = self.train(index.matrix, self.n_lists, n_iter, seed)
+            if dataset.path is not None:
+                try:
+                    for name, array in zip(names, arrays):
+                        dataset.save_array(name, array)
+                    arrays = [dataset.load_array(name) for name in names]
+                except OSError as e:
+                    # Read-only store: keep the lists trained in memory for this process
+                    print(f"Could not save the IVF lists to {dataset.path}: {e}")
+        self.centroids, self.offsets, self.rows = arrays
+
+    @staticmethod
+    def train(vectors, n_lists, n_iter=10, seed=0, sample_size=256, chunk_size=65536):
+        """Centroids fitted on a sample, then (centroids, offsets, rows): the rows of list i are rows[offsets[i]:offsets[i+1]]."""
+        rng = np.random.default_rng(seed)
+        sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), n_lists * sample_size), replace=False))]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.stack([np.bincount(assignment, weights=sample[:, column], minlength=n_lists)
+                             for column in range(sample.shape[1])], axis=1)
+            # Lists left empty are reseeded from random sample rows
+            empty = np.flatnonzero(np.bincount(assignment, minlength=n_lists) == 0)
+            sums[empty] = sample[rng.choice(len(sample), len(empty))]
+            centroids = (sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True),
+                                           np.finfo(np.float32).tiny)).astype(np.float32)
+        assignment = np.concatenate([np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+                                     for start in range(0, len(vectors), chunk_size)])
+        rows = np.argsort(assignment, kind='stable').astype(np.int32)
+        offsets = np.searchsorted(assignment[rows], np.arange(n_lists + 1)).astype(np.int64)
+        return centroids, offsets, rows
+
+    def candidates(self, query, candidates=None, n_probe=None):
+        """Sorted rows of the lists closest to the normalized query, restricted to candidates."""
+        probes = top_k(-(self.centroids @ query), min(n_probe or self.n_probe, self.n_lists))
+        rows = np.sort(np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in probes]))
+        if candidates is None:
+            return rows
+        if len(candidates) <= len(rows):
+            # A filter narrower than the probed lists is cheaper to score exactly
+            return candidates
+        return np.intersect1d(rows, candidates, assume_unique=True)
+
+
+SEARCH_BACKENDS = {'exact': ExactBackend, 'ivf': IVFBackend}
+# Backend used when a request does not name one
+DEFAULT_BACKEND = os.environ.get('RECIPE_SEARCH_BACKEND', 'exact')
+
+INDEX_ARRAYS = ('mean', 'scale', 'var', 'n_samples_seen', 'unit_matrix')
+
+
+class RecipeIndex:
+    """
+    Scaled nutrition matrix fitted once over a dataset, kept as C-contiguous float32 rows of unit length
+    so that the cosine distances of a query to every recipe are one matrix product.
+    Queries only transform the input and search, nothing is refitted per request.
+    For an on-disk store the scaler parameters, matrices and ingredient postings are saved next to it
+    by the first process and memory-mapped by every other one, so processes share them instead of each
+    holding a copy.
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.backends = {}
+        arrays = self.load_arrays(dataset)
+        if arrays is None:
+            arrays = self.build_arrays(dataset)
+            if dataset.path is not None:
+                try:
+                    self.save_arrays(dataset, arrays)
+                    arrays = self.load_arrays(dataset)
+                    remove_stale_indexes(dataset)
+                except OSError as e:
+                    # Read-only store: keep the arrays built in memory for this process
+                    print(f"Could not save the recipe index to {dataset.path}: {e}")
+        self.scaler = scaler_from_arrays(arrays['mean'], arrays['scale'], arrays['var'], arrays['n_samples_seen'])
+        # Cosine distance to a unit query q is 1 - matrix @ q
+        self.matrix = arrays['unit_matrix']
+        # Per-thread single-query distance buffers, reused across searches instead of allocated per query
+        self._buffers = threading.local()
+        self.ingredient_index = IngredientIndex.load(dataset)
+        if self.ingredient_index is None:
+            self.ingredient_index = IngredientIndex(dataset.column('RecipeIngredientParts'))
+            if dataset.path is not None:
+                try:
+                    self.ingredient_index.save(dataset)
+                    self.ingredient_index = IngredientIndex.load(dataset)
+                except OSError as e:
+                    print(f"Could not save the ingredient index to {dataset.path}: {e}")
+
+    @staticmethod
+    def build_arrays(dataset):
+        prep_data, scaler = scaling(dataset)
+        matrix = np.ascontiguousarray(prep_data, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), np.finfo(np.float32).tiny)
+        return {'mean': scaler.mean_, 'scale': scaler.scale_, 'var': scaler.var_,
+                'n_samples_seen': np.array([scaler.n_samples_seen_], dtype=np.int64),
+                'unit_matrix': matrix}
+
+    @staticmethod
+    def load_arrays(dataset):
+        """The index arrays saved for this build of an on-disk dataset, memory-mapped, or None if any is missing."""
+        arrays = {name: dataset.load_array(index_array_name(dataset, f'recipe/{name}')) for name in INDEX_ARRAYS}
+        if any(array is None for array in arrays.values()) or arrays['unit_matrix'].shape[0] != len(dataset):
+            return None
+        return arrays
+
+    @staticmethod
+    def save_arrays(dataset, arrays):
+        for name in INDEX_ARRAYS:
+            dataset.save_array(index_array_name(dataset, f'recipe/{name}'), arrays[name])
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def backend(self, name=None):
+        """The search backend registered under name (default DEFAULT_BACKEND), built on first use."""
+        name = name or DEFAULT_BACKEND
+        if name not in self.backends:
+            if name not in SEARCH_BACKENDS:
+                raise ValueError(f"Unknown search backend {name!r}, expected one of {sorted(SEARCH_BACKENDS)}")
+            self.backends[name] = SEARCH_BACKENDS[name](self)
+        return self.backends[name]
+
+    def transform(self, _input):
+        return self.scaler.transform(np.array(_input, dtype=float).reshape(-1, self.matrix.shape[1]))
+
+    def unit_queries(self, inputs):
+        """Scaled float32 queries of unit length, one row per input."""
+        queries = self.transform(inputs).astype(np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), np.finfo(np.float32).tiny)
+        return queries
+
+    def distances(self, queries):
+        """
+        Cosine distances of unit queries to every row, shape (queries, rows). A single query is written
+        into this thread's one-row buffer, valid until its next call; a batch gets a fresh array, so no
+        thread keeps a (queries x rows) buffer alive after serving one.
+        """
+        if len(queries) == 1:
+            out = getattr(self._buffers, 'distances', None)
+            if out is None:
+                out = self._buffers.distances = np.empty((1, len(self)), dtype=np.float32)
+        else:
+            out = np.empty((len(queries), len(self)), dtype=np.float32)
+        np.matmul(queries, self.matrix.T, out=out)
+        np.subtract(1, out, out=out)
+        return out
+
+    def search(self, _input, n_neighbors=5, candidates=None, return_distance=False, allowed=None,
+               backend=None, n_probe=None):
+        """
+        Row positions of the n_neighbors recipes closest to _input by cosine distance,
+        or (rows, distances) with return_distance.
+        When candidates (sorted row positions from any filter) is given, only those rows are scored,
+        in the same globally scaled space, so filtering never changes the distances.
+        allowed is an optional boolean mask over all rows (e.g. within budget); only rows where it
+        holds are returned, so fewer than n_neighbors may come back.
+        An approximate backend narrows the rows to score first; if that leaves fewer than n_neighbors
+        results the search is repeated exactly.
+        """
+        query = self.unit_queries(_input)
+        searcher = self.backend(backend)
+        if searcher.approximate:
+            narrowed = searcher.candidates(query[0], candidates, n_probe)
+            if len(narrowed) >= n_neighbors:
+                rows, distances = self._score(query, n_neighbors, narrowed, allowed)
+                if len(rows) >= n_neighbors:
+                    return (rows, distances) if return_distance else rows
+        rows, distances = self._score(query, n_neighbors, candidates, allowed)
+        return (rows, distances) if return_distance else rows
+
+    def _score(self, query, n_neighbors, candidates, allowed):
+        """(rows, distances) of the exact search() over candidates for one unit query."""
+        if candidates is None:
+            distances = self.distances(query)[0]
+            nearest = top_k(distances, n_neighbors) if allowed is None else top_k_allowed(distances, n_neighbors, allowed)
+            return nearest, distances[nearest]
+        distances = 1 - self.matrix[candidates] @ query[0]
+        if allowed is None:
+            nearest = top_k(distances, n_neighbors)
+        else:
+            nearest = top_k_allowed(distances, n_neighbors, allowed[candidates])
+        return candidates[nearest], distances[nearest]
+
+    def search_batch(self, inputs, n_neighbors, candidates, chunk_size=64, return_distance=False, allowed=None,
+                     backend=None, n_probe=None):
+        """
+        Answer many queries with one query-matrix by data-matrix product per chunk of queries.
+        n_neighbors, candidates and allowed hold one entry per query; candidates and allowed entries
+        may be None for no filter (see search()). Each result is the rows array, or (rows, distances)
+        with return_distance.
+        An approximate backend scores only its own candidates, so its queries are answered one by one.
+        """
+        if allowed is None:
+            allowed = [None] * len(inputs)
+        if self.backend(backend).approximate:
+            return [self.search(_input, k, rows, return_distance, mask, backend, n_probe)
+                    for _input, k, rows, mask in zip(inputs, n_neighbors, candidates, allowed)]
+        results = []
+        for start in range(0, len(inputs), chunk_size):
+            distances = self.distances(self.unit_queries(inputs[start:start + chunk_size]))
+            for row, k, rows, mask in zip(distances, n_neighbors[start:start + chunk_size],
+                                          candidates[start:start + chunk_size], allowed[start:start + chunk_size]):
+                if rows is not None:
+                    row = row[rows]
+                    mask = mask[rows] if mask is not None else None
+                nearest = top_k(row, k) if mask is None else top_k_allowed(row, k, mask)
+                found = nearest if rows is None else rows[nearest]
+                found_distances = row[nearest]
+                results.append((found, found_distances) if return_distance else found)
+        return results
+
+
+_index_cache = {}
+
+
+def get_index(dataset):
+    """Return the RecipeIndex for dataset, building it on first use."""
+    index = _index_cache.get(id(dataset))
+    if index is None or index.dataset is not dataset:
+        index = RecipeIndex(dataset)
+        _index_cache[id(dataset)] = index
+    return index
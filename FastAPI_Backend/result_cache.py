@@ -0,0 +1,103 @@
+"""
+Recommendation result cache
+Thread-safe LRU cache with a time-to-live in front of recommend(), keyed on the nutrition
+vector rounded to a fixed number of decimals plus the ingredients and params of the request,
+so repeated queries (Streamlit reruns, meal templates, identical API calls) skip the search.
+Counts hits and misses for monitoring.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Defaults, overridable per process; a size of 0 disables caching and a ttl of 0 never expires entries
+CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 600))
+CACHE_DECIMALS = 2
+
+_MISSING = object()
+
+
+def freeze(value):
+    """Hashable, order-independent form of a params value (dicts, lists, sets and arrays included)."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), freeze(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(item) for item in value))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def query_key(nutrition_input, ingredients=(), params=None, decimals=CACHE_DECIMALS):
+    """Cache key of one recommendation request; nutrition values closer than the rounding share a key."""
+    nutrition = np.round(np.asarray(nutrition_input, dtype=float).ravel(), decimals) + 0.0  # folds -0.0 into 0.0
+    return tuple(nutrition.tolist()), tuple(sorted(ingredients or ())), freeze(params or {})
+
+
+class ResultCache:
+    """
+    LRU cache of recommendation results with a time-to-live.
+    Values are stored as given, so callers should cache results they do not mutate
+    (row positions, RecommendationResult handles or serialised responses).
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, decimals=CACHE_DECIMALS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, nutrition_input, ingredients=(), params=None):
+        return query_key(nutrition_input, ingredients, params, self.decimals)
+
+    def get(self, key, default=None):
+        """The cached value for key, or default when missing or expired; counts a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """The cached value for key, or compute() stored under it (None results are cached too)."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
@@ -1,104 +1,183 @@
 import numpy as np
-import re
-import pandas as pd
 import streamlit as st
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import FunctionTransformer
 import os
+from dataset_store import NUTRITION_COLUMNS, load_dataset as load_dataset_from
+from recipe_index import get_index
+from shopping_list_generator import RecipeCostTable, budget_mask
+from recipe_tags import cuisine_bits, diet_bits
+from result_cache import ResultCache
 
 
-# Load dataset once at module level
-@st.cache_data
+# Per-recipe columns computed from each chunk when the CSV is ingested in chunks (DATASET_CHUNKSIZE),
+# so they are stored with the other columns instead of being recomputed on every start
+DERIVED_COLUMNS = {
+    'EstimatedCost': lambda chunk: RecipeCostTable(chunk['RecipeIngredientParts']).costs,
+    'DietBits': lambda chunk: diet_bits(chunk['Name'], chunk['RecipeIngredientParts']),
+    'CuisineBits': lambda chunk: cuisine_bits(chunk['Cuisine'] if 'Cuisine' in chunk.columns
+                                              else np.full(len(chunk), 'Other', dtype=object)),
+}
+
+
+# Load dataset once per process; cache_resource shares the same store instead of copying it per call
+@st.cache_resource
 def load_dataset():
-    # Try multiple paths for different deployment scenarios
-    possible_paths = [
-        os.path.join(os.path.dirname(__file__), '..', 'Data', 'dataset_enhanced.csv'),  # Local with cuisine tags
-        os.path.join(os.path.dirname(__file__), '..', 'Data', 'dataset.csv'),  # Fallback to original
-        os.path.join('Data', 'dataset_enhanced.csv'),  # Streamlit Cloud
-        os.path.join('Data', 'dataset.csv'),  # Alternative
-        'Data/dataset_enhanced.csv',
-        'Data/dataset.csv'
+    # Try multiple Data directories for different deployment scenarios
+    possible_dirs = [
+        os.path.join(os.path.dirname(__file__), '..', 'Data'),  # Local
+        'Data',  # Streamlit Cloud
     ]
     
-    for dataset_path in possible_paths:
-        if os.path.exists(dataset_path):
-            df = pd.read_csv(dataset_path, compression='gzip')
-            # Check if Cuisine column exists, if not add it as 'Other'
-            if 'Cuisine' not in df.columns:
-                df['Cuisine'] = 'Other'
-            return df
+    for data_dir in possible_dirs:
+        # Prefers the memory-mapped dataset_store, then dataset_enhanced.csv (with cuisine tags), then dataset.csv
+        try:
+            dataset = load_dataset_from(data_dir, derived=DERIVED_COLUMNS)
+        except FileNotFoundError:
+            continue
+        # Check if Cuisine column exists, if not add it as 'Other'
+        if 'Cuisine' not in dataset.columns:
+            dataset.columns['Cuisine'] = np.full(len(dataset), 'Other', dtype=object)
+        # Per-recipe cost estimates, precomputed by build_dataset_store.py or computed here once; the
+        # table's item arrays are dropped right away, a price_database override builds its own (get_cost_table)
+        if 'EstimatedCost' not in dataset.columns:
+            dataset.columns['EstimatedCost'] = RecipeCostTable(dataset.column('RecipeIngredientParts')).costs
+        # Cuisine and dietary bitmasks for restriction filtering, likewise
+        if 'DietBits' not in dataset.columns:
+            dataset.columns['DietBits'] = diet_bits(dataset.column('Name'), dataset.column('RecipeIngredientParts'))
+        if 'CuisineBits' not in dataset.columns:
+            dataset.columns['CuisineBits'] = cuisine_bits(dataset.column('Cuisine'))
+        return dataset
     
     # If none found, raise error
-    raise FileNotFoundError("Could not find dataset.csv or dataset_enhanced.csv in expected locations")
-
-
-def scaling(dataframe):
-    scaler = StandardScaler()
-    prep_data = scaler.fit_transform(dataframe.iloc[:, 6:15].to_numpy())
-    return prep_data, scaler
-
-
-def nn_predictor(prep_data):
-    neigh = NearestNeighbors(metric='cosine', algorithm='brute')
-    neigh.fit(prep_data)
-    return neigh
-
-
-def build_pipeline(neigh, scaler, params):
-    transformer = FunctionTransformer(neigh.kneighbors, kw_args=params)
-    pipeline = Pipeline([('std_scaler', scaler), ('NN', transformer)])
-    return pipeline
-
-
-def extract_data(dataframe, ingredients):
-    extracted_data = dataframe.copy()
-    extracted_data = extract_ingredient_filtered_data(extracted_data, ingredients)
-    return extracted_data
-
-
-def extract_ingredient_filtered_data(dataframe, ingredients):
-    extracted_data = dataframe.copy()
-    regex_string = ''.join(map(lambda x: f'(?=.*{x})', ingredients))
-    extracted_data = extracted_data[extracted_data['RecipeIngredientParts'].str.contains(
-        regex_string, regex=True, flags=re.IGNORECASE)]
-    return extracted_data
+    raise FileNotFoundError("Could not find dataset_store, dataset.csv or dataset_enhanced.csv in expected locations")
+
+
+# Columns callers need to filter and rank candidates; instructions and times are only read on hydration
+SUMMARY_COLUMNS = ['RecipeId', 'Name', 'Cuisine', 'RecipeIngredientParts', 'EstimatedCost'] + NUTRITION_COLUMNS
+
+
+class RecommendationResult:
+    """
+    Lightweight handle on one recommendation: matched row positions, their cosine distances and nutrition.
+    Recipe text is only read from the dataset by frame(), records() or hydrate_recipes().
+    """
+    def __init__(self, dataset, rows, distances):
+        self.dataset = dataset
+        self.rows = rows
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nutrition(self):
+        return self.dataset.nutrition[self.rows]
+
+    def frame(self):
+        """Every column of the matched recipes."""
+        return self.dataset.take(self.rows)
+
+    def records(self, columns=SUMMARY_COLUMNS):
+        """
+        Recipe dicts with only the given columns, plus '_row' and 'distance' so that
+        hydrate_recipes() can fill in the rest for the recipes that survive filtering.
+        """
+        records = self.dataset.take(self.rows, columns).to_dict("records")
+        for record, row, distance in zip(records, self.rows, self.distances):
+            record['_row'] = int(row)
+            record['distance'] = float(distance)
+        return records
+
+
+def hydrate_recipes(recipes, dataset=None):
+    """Fill in the columns missing from lightweight records() dicts, in place, reading only those rows."""
+    pending = [recipe for recipe in recipes if '_row' in recipe and 'RecipeInstructions' not in recipe]
+    if pending:
+        dataset = dataset if dataset is not None else load_dataset()
+        full_records = dataset.take([recipe['_row'] for recipe in pending]).to_dict("records")
+        for recipe, full_record in zip(pending, full_records):
+            for key, value in full_record.items():
+                recipe.setdefault(key, value)
+    return recipes
+
+
+def search_recipes(dataset, _input, ingredients=[], params={'n_neighbors': 5, 'return_distance': False}):
+    """
+    Like recommend(), but returns a RecommendationResult (or None) without materialising any recipe.
+    With params['max_cost'] the result holds the nearest recipes within that estimated cost,
+    which may be fewer than n_neighbors when the budget is tight.
+    """
+    index = get_index(dataset)
+    candidates = index.ingredient_index.lookup(ingredients)
+    n_candidates = len(index) if candidates is None else len(candidates)
+    if n_candidates >= params['n_neighbors']:
+        rows, distances = index.search(_input, params['n_neighbors'], candidates, return_distance=True,
+                                       allowed=budget_mask(dataset, params), backend=params.get('backend'),
+                                       n_probe=params.get('n_probe'))
+        return RecommendationResult(dataset, rows, distances)
+    else:
+        return None
 
 
-def apply_pipeline(pipeline, _input, extracted_data):
-    _input = np.array(_input).reshape(1, -1)
-    return extracted_data.iloc[pipeline.transform(_input)[0]]
+def search_recipes_batch(dataset, inputs, ingredients_list, params_list):
+    """Batched search_recipes(): one RecommendationResult (or None when too few recipes match) per input."""
+    index = get_index(dataset)
+    candidates = [index.ingredient_index.lookup(ingredients) for ingredients in ingredients_list]
+    n_neighbors = [params['n_neighbors'] for params in params_list]
+    answerable = [i for i, (rows, k) in enumerate(zip(candidates, n_neighbors))
+                  if (len(index) if rows is None else len(rows)) >= k]
+    output = [None] * len(inputs)
+    # Queries asking for the same backend and knobs are searched together
+    groups = {}
+    for i in answerable:
+        groups.setdefault((params_list[i].get('backend'), params_list[i].get('n_probe')), []).append(i)
+    for (backend, n_probe), members in groups.items():
+        found = index.search_batch([inputs[i] for i in members],
+                                   [n_neighbors[i] for i in members],
+                                   [candidates[i] for i in members],
+                                   return_distance=True,
+                                   allowed=[budget_mask(dataset, params_list[i]) for i in members],
+                                   backend=backend, n_probe=n_probe)
+        for i, (rows, distances) in zip(members, found):
+            output[i] = RecommendationResult(dataset, rows, distances)
+    return output
 
 
-def recommend(dataframe, _input, ingredients=[], params={'n_neighbors': 5, 'return_distance': False}):
-    extracted_data = extract_data(dataframe, ingredients)
-    if extracted_data.shape[0] >= params['n_neighbors']:
-        prep_data, scaler = scaling(extracted_data)
-        neigh = nn_predictor(prep_data)
-        pipeline = build_pipeline(neigh, scaler, params)
-        return apply_pipeline(pipeline, _input, extracted_data)
-    else:
-        return None
+def recommend(dataset, _input, ingredients=[], params={'n_neighbors': 5, 'return_distance': False}):
+    result = search_recipes(dataset, _input, ingredients, params)
+    return result.frame() if result is not None else None
 
 
-def extract_quoted_strings(s):
-    strings = re.findall(r'"([^"]*)"', s)
-    return strings
+def recommend_batch(dataset, inputs, ingredients_list, params_list):
+    """Batched recommend(): one DataFrame (or None when too few recipes match) per nutrition input."""
+    return [result.frame() if result is not None else None
+            for result in search_recipes_batch(dataset, inputs, ingredients_list, params_list)]
 
 
 def output_recommended_recipes(dataframe):
+    # Ingredient and instruction columns are already lists, parsed once when the dataset was loaded
     if dataframe is not None:
-        output = dataframe.copy()
-        output = output.to_dict("records")
-        for recipe in output:
-            recipe['RecipeIngredientParts'] = extract_quoted_strings(recipe['RecipeIngredientParts'])
-            recipe['RecipeInstructions'] = extract_quoted_strings(recipe['RecipeInstructions'])
+        output = dataframe.to_dict("records")
     else:
         output = None
     return output
 
 
+class Response:
+    """Mimics the requests.Response of the FastAPI backend so pages can call either."""
+    def __init__(self, output):
+        self.status_code = 200
+        self.output = output
+
+    def json(self):
+        return {'output': self.output}
+
+
+# RecommendationResult handles of recent requests; records are rebuilt from them on every call,
+# so pages can annotate the returned dicts without touching the cached entries
+result_cache = ResultCache()
+_cache_miss = object()
+
+
 class Generator:
     def __init__(self, nutrition_input: list, ingredients: list = [], params: dict = {'n_neighbors': 5, 'return_distance': False}):
         self.nutrition_input = nutrition_input
@@ -111,22 +190,63 @@ class Generator:
         self.ingredients = ingredients
         self.params = params
 
-    def generate(self):
-        # Use local model instead of API call
-        recommended = recommend(
+    def generate(self, lazy=False):
+        """
+        lazy returns lightweight records() dicts (name, ingredients, cuisine, nutrition) instead of full recipes;
+        call hydrate_recipes() on the ones you keep.
+        """
+        # Use local model instead of API call; reruns with unchanged inputs are answered from result_cache
+        key = result_cache.key(self.nutrition_input, self.ingredients, self.params)
+        result = result_cache.get_or_compute(key, lambda: search_recipes(
             self.dataset,
             self.nutrition_input,
             self.ingredients,
             self.params
-        )
-        output = output_recommended_recipes(recommended)
+        ))
+        if result is None:
+            output = None
+        elif lazy:
+            output = result.records()
+        else:
+            output = output_recommended_recipes(result.frame())
         
         # Return in same format as API response
-        class Response:
-            def __init__(self):
-                self.status_code = 200
-                
-            def json(self):
-                return {'output': output}
-        
-        return Response()
+        return Response(output)
+
+    @staticmethod
+    def generate_batch(items, lazy=False):
+        """
+        Answer many requests at once, like POST /predict/batch.
+        items is a list of dicts with 'nutrition_input' and optional 'ingredients' and 'params' keys,
+        the response output holds one recipe list (or None) per item, in order; lazy as in generate().
+        """
+        params_list = [item.get('params', {'n_neighbors': 5, 'return_distance': False}) for item in items]
+        keys = [result_cache.key(item['nutrition_input'], item.get('ingredients', []), params)
+                for item, params in zip(items, params_list)]
+        results = [result_cache.get(key, _cache_miss) for key in keys]
+        # Only the items not answered from the cache are searched, in one batch
+        missing = [i for i, result in enumerate(results) if result is _cache_miss]
+        if missing:
+            found = search_recipes_batch(
+                load_dataset(),
+                [items[i]['nutrition_input'] for i in missing],
+                [items[i].get('ingredients', []) for i in missing],
+                [params_list[i] for i in missing]
+            )
+            for i, result in zip(missing, found):
+                results[i] = result
+                result_cache.put(keys[i], result)
+        output = []
+        for result in results:
+            if result is None:
+                output.append(None)
+            elif lazy:
+                output.append(result.records())
+            else:
+                output.append(output_recommended_recipes(result.frame()))
+        return Response(output)
+
+    @staticmethod
+    def cache_stats():
+        """Hit/miss counters and size of the result cache shared by generate() and generate_batch()."""
+        return result_cache.stats()
@@ -1,21 +1,156 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 Not_found_link='data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAASsAAACoCAMAAACPKThEAAAAaVBMVEVXV1ny8vNPT1Gvr7BcXF76+vtUVFZMTE7t7e719fZVVVfOzs9OTlBra23Z2duKioz///+YmJm2trhtbW9mZmhFRUdhYWM7Oz7l5eaSkpPLy8zf3+B4eHm+vsCpqarExMV8fH6hoaOCg4ScyldqAAAGIklEQVR4nO2cC5OiOhBGIZCEAEJ4Dqyg4v//kTfBt8PM9jj3YtXNd8rd0hCrsqe6myaLeAHzAAUWeHBFBK7owBUduKIDV3Tgig5c0YErOnBFB67owBUduKIDV3Tgig5c0YErOnBFB67owBUduKIDV3Tgig5c0YErOnBFB67owBUduKIDV3Tgig5c0YErOnBFB67owBUduKIDV3Tgig5c0YErOnBFB67owBUduKIDV3Tgig5c0XmXK/Fb3rDmN7kK898Srr/o97gSlea/Q1fx6qt+k6sN938H36yfhe90pV5lduVWXGWv4l5cRR/yNT4il1zFsyv54relU67EC67ia4GCq++/IL26ZunpA1x9R1r98TmPSm8WBFffkObc9gm+imprCK6+mV1dOlcVwdV5LV/Mlpm6tus7Bld2MPki0MLbBZHaSrgyK+l1sChLHO4vHhFXBpkonqdLk+HqyVVsM01ViwaQg4+u2M4UcNWJhe0DE3HX2j4hroyAzgpRSfPF7FNYdXatrrsSw8kHLxdkseO8Z6V41976K6f2rx5cyfGcZ4v1nbVjpFQXMFzj2JHoWr6X6nssWRtKXDvPy+iv57rl+m50Xd857uruVGfq+18uFN12Fbc3VcZDsFDf73C7ts/N1Z2sfql/v+JWXD3vt5+aqxuP9f1ZnFuunuLq8YrvtE91TTHBxqdvO+3q2lzd1fdLyUqrju8f65fTrpj/CV6ejjaFadn58WGJLru6a66e6rtI9/Oh6EGMW64ea3uTPKfgub6nm3PNVw9Z6Jarh7iKw4WwsvU9LdRFIs/vFumwq6fm6ibrvpGI7lpPh109N1fL4u6y0F1Xl52rv3CXhe66+txcLXM7F7rrSpBM3Wehs64Wm6vlLLx0pM66kovN1bdZ6KqruCarMll4rnCOukq/aK6Ws/B0LnTVFam5umXhvOvuqKtPO1d/y0J7LnTUldzzH/0KQPfCWVes/CGBw/czsPRn4H6Gn+Giq4a9RuOgq754jd49V/7LP7T03XP1GxxyVemXf2h5gi/fWfqf8qb/x6mz5HdktSv3fnjxiz+zvLG+KjzL4gfAFR24ogNXdOCKzptdfXU2Wx6P33Dyu2M1V7EwLzE/oMi7/C3DjWDnZxbZOfaDmeel3sb8iW/j8xuR1nUq5gmeiE+T43mWXKcvXcsVC3gzqkyKXPmhJ7fK9JJs5Nov5EHZp6XY3tLPZBr4TJZc87IJuB8pngsvtBOiZui03lYy4CbqVNCqRKZj95GYY9thFVlruUpLbVzx2m4ah2LgKkjN0FTtdTXoIO97+4wmxacmUM2kg2qnd1Vf8qnfxHGox7zPmd8Nhy5qAm1c8bLlvG/G6CPr8iJS4RrZuaqryJ8af6tCOXZlJIW/b1LZbwZdtHVr/7Fqq7xAfXRZI5oskrLXVWqyLNRTI5tCDyw96vzqqvOldbVt5KCndXJjRVfduB34jodM7Sp9CPVOFllSDFxr3dlNUl50f3aqUWNq5iuPGT1ivpfNzNgF2pSwVk+7syudR2NpXUkv1eW3N8T/S6wbVweeJAWPe53s+V6qsTlOKhh0np5qOJ8GnflNlDRxk0Tp1ZUONlU4aXMiGHQfaFPNZ1dHnnU2rlj9P4yrqIl4MfE06coyU6Z0HY0O42qqhsHWK1OuRu43pe5FbkLl5mqSQrQ8CdtMiUIXojdpq/sm4cZVtxkyvsquw5qu9v7HqNmkK72zNaZgmeb+1riySWj3o/SUer5K2R8zkrBrDrbaPpWB5Upr/8hYYo5mJpZ61iqTg+bLUb5K27Naf9Vu4rYWoX2FG/NZ1K2Q1TEMW6+22Dl16InWvDPjla1f80TDZn6QIfMOB9tUnY9u5snmVddsnW56vb49vr3i82fvVKZiy2XoPC6868Ctiz+Pno7G3qkXjVfr5nE9SAeu6MAVHbiiA1d04IoOXNGBKzpwRQeu6MAVHbiiA1d04IoOXNGBKzpwRQeu6MAVHbiiA1d04IoOXNGBKzpwRQeu6MAVHbiiA1d04IoOXNGBKzpwRQeu6MAVHbiiA1d04IoOXNGBKzpwRQeu6MAVHbiiA1d04IoOXNGxruIQUIiDfwBxfHlxYfsoogAAAABJRU5ErkJggg=='
 
-def get_images_links(searchTerm):
-    try:
-        searchUrl = "https://www.google.com/search?q={}&site=webhp&tbm=isch".format(searchTerm)
-        d = requests.get(searchUrl).text
-        soup = BeautifulSoup(d, 'html.parser')
+SEARCH_URL = "https://www.google.com/search?q={}&site=webhp&tbm=isch"
+CACHE_PATH = os.environ.get('IMAGE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache.sqlite'))
+# Seconds a failed lookup (timeout, rate limit, no result) is answered with Not_found_link before it is retried
+FAILURE_TTL = float(os.environ.get('IMAGE_FAILURE_TTL', 300))
+
+
+class ImageFinder:
+    """
+    Resolves recipe names to image links through a two-level cache:
+    an in-memory LRU in front of a persistent SQLite table, keyed by recipe name.
+    Misses are fetched concurrently over one pooled HTTP session with per-request timeouts.
+    Failed lookups are never written to disk and are remembered in memory for failure_ttl seconds
+    only, so a transient timeout or rate limit does not hide an image for the life of the process.
+    """
+
+    def __init__(self, search_url=SEARCH_URL, cache_path=CACHE_PATH, memory_size=2048, max_workers=8, timeout=(3, 5),
+                 failure_ttl=FAILURE_TTL):
+        self.search_url = search_url
+        self.memory_size = memory_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.failure_ttl = failure_ttl
+        self._memory = OrderedDict()
+        # Name -> time of its failed lookup, oldest first
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._db = self._open_cache(cache_path)
 
-        img_tags = soup.find_all('img')
+    @staticmethod
+    def _open_cache(cache_path):
+        if not cache_path:
+            return None
+        try:
+            db = sqlite3.connect(cache_path, check_same_thread=False)
+            db.execute("CREATE TABLE IF NOT EXISTS images (name TEXT PRIMARY KEY, link TEXT NOT NULL)")
+            db.commit()
+            return db
+        except sqlite3.Error:
+            # Read-only or missing directory: keep working with the in-memory cache only
+            return None
 
-        imgs_urls = []
-        for img in img_tags:
-            if img['src'].startswith("http"):
-                imgs_urls.append(img['src'])
+    def _remember(self, name, link):
+        self._memory[name] = link
+        self._memory.move_to_end(name)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
 
-        return(imgs_urls[0])
-    except:
+    def _cached(self, names):
+        """Links already known for names, from memory first and then from disk."""
+        found = {}
+        with self._lock:
+            expired = time.monotonic() - self.failure_ttl
+            while self._failures and next(iter(self._failures.values())) < expired:
+                self._failures.popitem(last=False)
+            for name in names:
+                if name in self._memory:
+                    self._memory.move_to_end(name)
+                    found[name] = self._memory[name]
+                elif name in self._failures:
+                    found[name] = Not_found_link
+            missing = [name for name in names if name not in found]
+            if missing and self._db is not None:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self._db.execute("SELECT name, link FROM images WHERE name IN ({})".format(','.join('?' * len(chunk))), chunk)
+                    for name, link in rows:
+                        found[name] = link
+                        self._remember(name, link)
+        return found
+
+    def _store(self, links):
+        now = time.monotonic()
+        with self._lock:
+            for name, link in links.items():
+                self._failures.pop(name, None)
+                if link == Not_found_link:
+                    self._failures[name] = now
+                else:
+                    self._remember(name, link)
+            while len(self._failures) > self.memory_size:
+                self._failures.popitem(last=False)
+            if self._db is not None:
+                found = [(name, link) for name, link in links.items() if link != Not_found_link]
+                if found:
+                    try:
+                        self._db.executemany("INSERT OR REPLACE INTO images (name, link) VALUES (?, ?)", found)
+                        self._db.commit()
+                    except sqlite3.Error:
+                        pass
+
+    def fetch(self, searchTerm):
+        """Look one name up over the network, bypassing the cache."""
+        try:
+            searchUrl = self.search_url.format(urllib.parse.quote_plus(searchTerm))
+            d = self.session.get(searchUrl, timeout=self.timeout).text
+            soup = BeautifulSoup(d, 'html.parser')
+
+            for img in soup.find_all('img'):
+                if img.get('src', '').startswith("http"):
+                    return img['src']
+        except Exception:
+            pass
         return Not_found_link
+
+    def get_many(self, names):
+        """Image links for names, in order; each distinct uncached name is fetched once, concurrently."""
+        names = list(names)
+        links = self._cached(set(names))
+        missing = [name for name in dict.fromkeys(names) if name not in links]
+        if missing:
+            if len(missing) == 1:
+                fetched = {missing[0]: self.fetch(missing[0])}
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                    fetched = dict(zip(missing, executor.map(self.fetch, missing)))
+            self._store(fetched)
+            links.update(fetched)
+        return [links[name] for name in names]
+
+
+_finder = None
+
+
+def get_finder():
+    """The process-wide ImageFinder, created on first use."""
+    global _finder
+    if _finder is None:
+        _finder = ImageFinder()
+    return _finder
+
+
+def get_images_links(searchTerm):
+    return get_finder().get_many([searchTerm])[0]
+
+
+def get_images_links_many(names):
+    """Bulk get_images_links(): one link per name, in order, resolved concurrently."""
+    return get_finder().get_many(names)
@@ -2,14 +2,38 @@
 Local LLM-based chatbot for diet and nutrition questions.
 Uses TinyLlama model running locally via Hugging Face transformers.
 No API keys required.
+With LLM_WORKER_URL set, questions go to the shared inference worker (llm_worker.py)
+instead of loading a model copy in this process.
 """
 
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from transformers.cache_utils import Cache, DynamicCache
+from transformers.generation.streamers import BaseStreamer
 import warnings
 
+from recipe_tags import DIET_TAGS, EXCLUDED_TAGS, PLANT_BASED
+from result_cache import ResultCache
+
 warnings.filterwarnings("ignore")
 
+# Hugging Face model id or local directory of the chat model
+LLM_MODEL_NAME = os.environ.get('LLM_MODEL_NAME', "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+# Base URL of the shared inference worker, e.g. http://localhost:8090; unset to run the model in-process
+LLM_WORKER_URL = os.environ.get('LLM_WORKER_URL')
+# CPU weight format: "int8" quantizes the Linear layers dynamically (smaller, faster, slightly different
+# answers), anything else keeps the float32 weights; ignored on CUDA, which runs in float16
+LLM_QUANTIZE = os.environ.get('LLM_QUANTIZE', '').lower()
+
 # Global variables to cache the model and tokenizer
 _model = None
 _tokenizer = None
@@ -27,7 +51,7 @@ def load_model():
     
     print("Loading TinyLlama model... This may take a moment on first run.")
     
-    model_name = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+    model_name = LLM_MODEL_NAME
     
     # Determine device
     _device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -53,12 +77,385 @@ def load_model():
     
     _model.eval()
     
+    if _device == "cpu" and LLM_QUANTIZE == "int8":
+        _model = quantize_int8(_model)
+    
     print("Model loaded successfully!")
     
     return _model, _tokenizer, _device
 
+def quantize_int8(model):
+    """
+    Replace the model's Linear layers (attention, MLP and lm_head) with int8 dynamically quantized ones:
+    weights are stored in int8 and activations are quantized per batch at run time. CPU only.
+    """
+    print("Quantizing the model to int8 (dynamic, Linear layers)...")
+    # In place, so the float32 Linear weights are freed as they are replaced
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+SYSTEM_PROMPT = """You are a helpful diet and nutrition assistant. You answer questions about recommended recipes, ingredients, substitutions, and simple modifications. Keep your answers concise and practical. If a question is unrelated to food or nutrition, politely say you don't know."""
+
+# Sampling settings shared by the blocking and streaming answers
+GENERATION_KWARGS = dict(
+    max_new_tokens=512,  # Increased from 256 to allow complete responses
+    temperature=0.7,
+    top_p=0.9,
+    do_sample=True,
+    repetition_penalty=1.1
+)
+
+
+def build_prefix(context_text: str) -> str:
+    """System prompt and recipe context: the start of the prompt that stays the same across chat turns."""
+    return f"""<|system|>
+{SYSTEM_PROMPT}
+
+Current Recommendations:
+{context_text}
+</s>
+"""
+
+
+def recent_history(history_text: str) -> list:
+    """The previous chat lines the prompt includes: the last 3 exchanges, minus the current user message."""
+    if not history_text.strip():
+        return []
+    # Only recent exchanges, to keep the context manageable
+    history_lines = history_text.strip().split('\n')
+    return history_lines[-6:-1]  # Exclude the current user message (it's already in user_message)
+
+
+def build_prompt(context_text: str, history_text: str, user_message: str) -> str:
+    """Build the prompt using TinyLlama's chat format."""
+    prompt = build_prefix(context_text)
+    
+    # Add conversation history if available
+    for line in recent_history(history_text):
+        if line.startswith("User:"):
+            prompt += f"<|user|>\n{line[5:].strip()}</s>\n"
+        elif line.startswith("Assistant:"):
+            prompt += f"<|assistant|>\n{line[10:].strip()}</s>\n"
+    
+    # Add current user message
+    prompt += f"<|user|>\n{user_message}</s>\n<|assistant|>\n"
+    return prompt
+
+
+def clean_response(response: str, user_message: str) -> str:
+    """Strip the decoded reply and any accidental repetition of the user's question."""
+    response = response.strip()
+    if response.startswith(user_message):
+        response = response[len(user_message):].strip()
+    return response if response else "I'm not sure how to answer that. Could you rephrase your question?"
+
+
+def _encode_prompt(tokenizer, device, context_text, history_text, user_message):
+    inputs = tokenizer(build_prompt(context_text, history_text, user_message),
+                       return_tensors="pt", truncation=True, max_length=1536)
+    return {k: v.to(device) for k, v in inputs.items()}
+
+
+# Past key/values of recent prompt prefixes (see build_prefix()), least recently used first. Each chat
+# session keeps asking about the same recipes, so its follow-up questions only prefill the new tokens.
+# An entry takes roughly 45 kB per prefix token for TinyLlama in float32.
+PREFIX_CACHE_SIZE = int(os.environ.get('LLM_PREFIX_CACHE_SIZE', 4))
+_prefix_cache = OrderedDict()
+_prefix_lock = threading.Lock()
+
+
+def _prefix_past(model, tokenizer, device, context_text, input_ids):
+    """
+    (past_key_values, n_tokens): a copy of the cached key/values of the prompt prefix for context_text,
+    computed on first use, covering the tokens input_ids shares with it (always leaving one to prefill).
+    (None, 0) when the cache is disabled or nothing is shared.
+    Needs transformers >= 4.42, where generate() prefills only the input_ids past the cache length;
+    a model that does not return a Cache object gets the full prompt instead.
+    """
+    if PREFIX_CACHE_SIZE <= 0:
+        return None, 0
+    prefix = build_prefix(context_text)
+    with _prefix_lock:
+        entry = _prefix_cache.get(prefix)
+        if entry is not None:
+            _prefix_cache.move_to_end(prefix)
+    if entry is None:
+        prefix_ids = tokenizer(prefix, return_tensors="pt", truncation=True, max_length=1536)['input_ids'].to(device)
+        with torch.no_grad():
+            # An explicit DynamicCache, since some versions return legacy tuples when given none
+            past = model(input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True).past_key_values
+        if not isinstance(past, Cache) or not hasattr(past, 'crop'):
+            return None, 0
+        entry = (prefix_ids[0].tolist(), past)
+        with _prefix_lock:
+            _prefix_cache[prefix] = entry
+            while len(_prefix_cache) > PREFIX_CACHE_SIZE:
+                _prefix_cache.popitem(last=False)
+    
+    cached_ids, past = entry
+    ids = input_ids[0].tolist()
+    # Tokens can merge across the prefix boundary, so only the actually shared leading tokens are reused
+    limit = min(len(cached_ids), len(ids) - 1)
+    shared = 0
+    while shared < limit and cached_ids[shared] == ids[shared]:
+        shared += 1
+    if shared == 0:
+        return None, 0
+    # generate() appends to the cache in place, so every answer works on its own copy
+    past = copy.deepcopy(past)
+    if shared < len(cached_ids):
+        past.crop(shared - len(cached_ids))
+    return past, shared
+
+
+def _prepare_generation(model, tokenizer, device, context_text, history_text, user_message):
+    """Tokenized prompt plus generate() keyword arguments, reusing the cached prefix key/values."""
+    inputs = _encode_prompt(tokenizer, device, context_text, history_text, user_message)
+    past, cached_tokens = _prefix_past(model, tokenizer, device, context_text, inputs['input_ids'])
+    if past is not None:
+        inputs['past_key_values'] = past
+    return inputs, cached_tokens
+
+
+def clear_prefix_cache():
+    with _prefix_lock:
+        _prefix_cache.clear()
+
+
+# Structured questions (nutrient amounts, ingredients, cost, vegetarian/vegan) are answered straight from the
+# recommended recipe dicts, and model answers are cached per (recipe context, normalized question), so only
+# new open-ended questions reach model.generate.
+
+# Recipe field, label and unit of each nutrient, with the words that ask for it (saturated fat before fat)
+NUTRIENTS = [
+    ('SaturatedFatContent', 'saturated fat', 'g', r'saturated fats?|sat fats?'),
+    ('Calories', 'calories', 'kcal', r'calori\w*|kcals?|energy'),
+    ('ProteinContent', 'protein', 'g', r'proteins?'),
+    ('CarbohydrateContent', 'carbohydrates', 'g', r'carbohydrates?|carbs?'),
+    ('SugarContent', 'sugar', 'g', r'sugars?'),
+    ('FiberContent', 'fiber', 'g', r'fibers?|fibres?'),
+    ('SodiumContent', 'sodium', 'mg', r'sodium|salt'),
+    ('CholesterolContent', 'cholesterol', 'mg', r'cholesterol'),
+    ('FatContent', 'fat', 'g', r'fats?'),
+]
+# Questions with these words want advice, not a lookup, and go to the model
+OPEN_ENDED_WORDS = re.compile(r'\b(why|replace|substitut\w*|swap|instead|alternatives?|without|make|cook|prepare|'
+                              r'should|could|would|suggest|recommend\w*|better|healthier|good|enough|too|reduce|lower|'
+                              r'increase|add|remove)\b')
+AMOUNT_WORDS = re.compile(r'\bhow (much|many)\b|\bwhat (is|are|s) the\b|\bamount\b|\btotal\b|\bcount\b')
+TOTAL_WORDS = re.compile(r'\b(total|altogether|combined|overall|sum)\b')
+ALL_WORDS = re.compile(r'\b(total|all|each|every|altogether|combined|overall|these|those|them|they|plan|meals|'
+                       r'recipes|dishes)\b')
+MOST_WORDS = re.compile(r'\b(most|highest|max|maximum|biggest|largest|richest)\b')
+LEAST_WORDS = re.compile(r'\b(least|lowest|fewest|min|minimum|smallest|lightest)\b')
+COST_WORDS = re.compile(r'\b(cost|costs|price|prices|priced|spend|expensive|cheap|cheaper|cheapest|pricey|priciest)\b')
+INGREDIENT_QUESTION = re.compile(r'\bingredients?\b|\bwhat (is|s) in\b|\bwhats in\b')
+# Lookups only: "can the curry be vegan?" asks for a substitution and goes to the model
+DIET_QUESTION = re.compile(r'^(is|are|does|do)\b.*\b(vegetarian|vegan)\b')
+
+# Answer cache defaults, overridable per process; a size of 0 disables it and a ttl of 0 never expires answers
+ANSWER_CACHE_SIZE = int(os.environ.get('LLM_ANSWER_CACHE_SIZE', 256))
+ANSWER_CACHE_TTL = float(os.environ.get('LLM_ANSWER_CACHE_TTL', 3600))
+answer_cache = ResultCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase words and numbers only, so that case, punctuation and spacing do not change a question."""
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower().replace("'", "")))
+
+
+def answer_cache_key(context_text: str, history_text: str, user_message: str):
+    """Context hash, hash of the history lines the prompt sees, and the normalized question."""
+    history = '\n'.join(recent_history(history_text))
+    return (hashlib.sha1(context_text.encode('utf-8')).hexdigest(),
+            hashlib.sha1(history.encode('utf-8')).hexdigest(), normalize_question(user_message))
+
+
+def clear_answer_cache():
+    answer_cache.clear()
+
+
+def _cacheable(stats: dict, response: str) -> bool:
+    """Only answers the model actually generated are cached: no error and real generation stats."""
+    return 'error' not in stats and stats.get('tokens', 0) > 0 and bool(response.strip())
+
+
+def _mentions(question, phrase):
+    phrase = normalize_question(phrase)
+    return bool(phrase) and f' {phrase} ' in f' {question} '
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value  # NaN
+
+
+def _amount(value, unit):
+    # Plain "USD" rather than "$": Streamlit markdown reads text between two dollar signs as math
+    if unit == 'USD':
+        return f"{value:.2f} USD"
+    return f"{value:.0f} {unit}" if unit == 'kcal' else f"{value:.1f} {unit}"
+
+
+def _recipe_title(labels, recipe):
+    name = recipe.get('Name', 'Recipe')
+    return f"{' '.join(labels)}: {name}" if labels else name
+
+
+def _recipe_cost(recipe):
+    if _number(recipe.get('estimated_cost')) is not None:
+        return float(recipe['estimated_cost'])
+    from shopping_list_generator import estimate_recipe_cost
+    return estimate_recipe_cost(recipe)
+
+
+def _targets(question, recipes):
+    """
+    The recipes a question is about: those named in it, else those whose label parts it mentions most
+    (e.g. "day 2 lunch" picks one slot, "day 2" the whole day), else all of them when there is just one
+    or the question asks about all ("total", "each", "these", ...); None when it is unclear.
+    """
+    named = [(labels, recipe) for labels, recipe in recipes if _mentions(question, str(recipe.get('Name', '')))]
+    if named:
+        return named
+    scores = [sum(_mentions(question, label) for label in labels) for labels, _ in recipes]
+    best = max(scores, default=0)
+    if best > 0:
+        return [pair for pair, score in zip(recipes, scores) if score == best]
+    if len(recipes) == 1 or ALL_WORDS.search(question):
+        return list(recipes)
+    return None
+
+
+def _values_answer(question, targets, title, value_of, unit):
+    """One line per recipe, plus the total when asked for and the recipes are distinct slots of a plan."""
+    values = [(labels, recipe, value_of(recipe)) for labels, recipe in targets]
+    values = [(labels, recipe, value) for labels, recipe, value in values if value is not None]
+    if not values:
+        return None
+    if len(values) == 1:
+        labels, recipe, value = values[0]
+        if unit == 'USD':
+            return f"{_recipe_title(labels, recipe)} costs about {_amount(value, unit)}."
+        if unit == 'kcal':
+            return f"{_recipe_title(labels, recipe)} has {_amount(value, unit)}."
+        return f"{_recipe_title(labels, recipe)} has {_amount(value, unit)} of {title}."
+    lines = [f"{title.capitalize()} per recipe:"]
+    lines += [f"- {_recipe_title(labels, recipe)}: {_amount(value, unit)}" for labels, recipe, value in values]
+    label_sets = [tuple(labels) for labels, _, _ in values]
+    # Several recipes under one label are alternatives for that meal, so they are not added up
+    if TOTAL_WORDS.search(question):
+        if all(label_sets) and len(set(label_sets)) == len(label_sets):
+            lines.append(f"\n**Total: {_amount(sum(value for _, _, value in values), unit)}**")
+        else:
+            lines.append("\n*These recipes are alternatives to choose from, so they are not added up.*")
+    return '\n'.join(lines)
+
+
+def _extreme_answer(recipes, title, value_of, unit, most):
+    values = [(labels, recipe, value_of(recipe)) for labels, recipe in recipes]
+    values = [(labels, recipe, value) for labels, recipe, value in values if value is not None]
+    if not values:
+        return None
+    labels, recipe, value = (max if most else min)(values, key=lambda item: item[2])
+    amount = _amount(value, unit)
+    if unit == 'USD':
+        return f"{_recipe_title(labels, recipe)} is the {'most expensive' if most else 'cheapest'} at about {amount}."
+    return f"{_recipe_title(labels, recipe)} has the {'most' if most else 'least'} {title}, with {amount}."
+
+
+def _diet_answer(targets, diet):
+    excluded = EXCLUDED_TAGS['Vegan' if diet == 'vegan' else 'Vegetarian']
+    # Every tag but the vegan-only ones (dairy, egg) marks an animal, including the specific ones like seafood
+    vegan_only = set(EXCLUDED_TAGS['Vegan']) - set(EXCLUDED_TAGS['Vegetarian'])
+    keywords = {keyword for tag, words in DIET_TAGS.items() if diet == 'vegan' or tag not in vegan_only
+                for keyword in words}
+    pattern = re.compile(r'\b(' + '|'.join(sorted(map(re.escape, keywords))) + r')(e?s)?\b')
+    lines = []
+    for labels, recipe in targets:
+        text = ' '.join([str(recipe.get('Name', ''))] + [str(part) for part in recipe.get('RecipeIngredientParts', [])]).lower()
+        text = PLANT_BASED.sub(' ', text)
+        found = sorted({match.group(1) for match in pattern.finditer(text)})
+        title = _recipe_title(labels, recipe)
+        if found:
+            lines.append(f"No, {title} is not {diet}: it contains {', '.join(found)}.")
+        else:
+            lines.append(f"Yes, {title} looks {diet}: none of its ingredients are {' or '.join(excluded)}.")
+    if len(lines) > 1:
+        lines = [f"- {line}" for line in lines]
+    return '\n'.join(lines) + "\n\n*Based on the ingredient list; check labels for hidden animal products.*"
+
+
+def _ingredients_answer(targets):
+    lines = []
+    for labels, recipe in targets:
+        ingredients = [str(part) for part in recipe.get('RecipeIngredientParts', [])]
+        if ingredients:
+            lines.append(f"**{_recipe_title(labels, recipe)}**: {', '.join(ingredients)}")
+    if not lines:
+        return None
+    return '\n\n'.join(lines)
+
+
+def answer_from_recipes(recipes, user_message: str):
+    """
+    Answer a structured question from the recommendation data, or return None to leave it to the model.
+    
+    Handles nutrient amounts ("how much protein in X?", "total calories of day 2"), the recipe with the
+    most or least of a nutrient or cost, ingredient lists, costs and "is X vegetarian/vegan?".
+    
+    Args:
+        recipes: (labels, recipe dict) pairs, where labels is a tuple of names the user may refer to the
+            recipe by, such as ('Day 2', 'Lunch'), and may be empty
+        user_message: The latest user question
+    """
+    question = normalize_question(user_message)
+    recipes = [(tuple(labels), recipe) for labels, recipe in recipes or () if isinstance(recipe, dict)]
+    if not recipes or not question or OPEN_ENDED_WORDS.search(question):
+        return None
+    
+    diet = DIET_QUESTION.search(question)
+    if diet:
+        # "Is this vegan?" about several recipes is answered for each of them
+        return _diet_answer(_targets(question, recipes) or recipes, diet.group(2))
+    
+    nutrient = next((item for item in NUTRIENTS if re.search(rf'\b({item[3]})\b', question)), None)
+    if nutrient or COST_WORDS.search(question):
+        if nutrient:
+            field, title, unit, _ = nutrient
+            value_of = lambda recipe: _number(recipe.get(field))
+        else:
+            title, unit, value_of = 'estimated cost', 'USD', _recipe_cost
+        most = MOST_WORDS.search(question) or re.search(r'\b(expensive|pricey|priciest)\b', question)
+        least = LEAST_WORDS.search(question) or re.search(r'\b(cheap|cheaper|cheapest)\b', question)
+        if re.search(r'\b(which|what)\b', question) and bool(most) != bool(least):
+            return _extreme_answer(_targets(question, recipes) or recipes, title, value_of, unit, bool(most))
+        if AMOUNT_WORDS.search(question) or (not nutrient and re.search(r'\bcosts?\b', question)):
+            targets = _targets(question, recipes)
+            return _values_answer(question, targets, title, value_of, unit) if targets else None
+        return None
+    
+    if INGREDIENT_QUESTION.search(question):
+        targets = _targets(question, recipes)
+        return _ingredients_answer(targets) if targets else None
+    return None
+
 
-def generate_chat_answer(context_text: str, history_text: str, user_message: str) -> str:
+def _instant_answer(context_text: str, history_text: str, user_message: str, recipes=None):
+    """(answer, 'recipes' or 'cache') when the question needs no generation, else (None, None)."""
+    answer = answer_from_recipes(recipes, user_message) if recipes else None
+    if answer is not None:
+        return answer, 'recipes'
+    answer = answer_cache.get(answer_cache_key(context_text, history_text, user_message))
+    if answer is not None:
+        return answer, 'cache'
+    return None, None
+
+
+def generate_chat_answer(context_text: str, history_text: str, user_message: str, recipes=None) -> str:
     """
     Generate a chat response using the local LLM.
     
@@ -66,75 +463,353 @@ def generate_chat_answer(context_text: str, history_text: str, user_message: str
         context_text: Text describing current recommended recipes and ingredients
         history_text: Compact text representation of previous chat turns
         user_message: The latest user question
+        recipes: Optional (labels, recipe dict) pairs behind context_text; structured questions about
+            them are answered directly (see answer_from_recipes())
         
     Returns:
         The assistant's reply as a string
     """
+    answer, _ = _instant_answer(context_text, history_text, user_message, recipes)
+    if answer is not None:
+        return clean_response(answer, user_message)
+    if LLM_WORKER_URL:
+        stats = {}
+        response = ''.join(_stream_from_worker(context_text, history_text, user_message, stats))
+        if _cacheable(stats, response):
+            answer_cache.put(answer_cache_key(context_text, history_text, user_message), response)
+        return clean_response(response, user_message)
     try:
         model, tokenizer, device = load_model()
-        
-        # Build the prompt using TinyLlama's chat format
-        system_prompt = """You are a helpful diet and nutrition assistant. You answer questions about recommended recipes, ingredients, substitutions, and simple modifications. Keep your answers concise and practical. If a question is unrelated to food or nutrition, politely say you don't know."""
-        
-        # Format the prompt
-        prompt = f"""<|system|>
-{system_prompt}
-
-Current Recommendations:
-{context_text}
-</s>
-"""
-        
-        # Add conversation history if available
-        if history_text.strip():
-            # Parse history to extract only recent exchanges (last 3 to keep context manageable)
-            history_lines = history_text.strip().split('\n')
-            recent_history = history_lines[-6:] if len(history_lines) > 6 else history_lines
-            
-            for line in recent_history[:-1]:  # Exclude the current user message (it's already in user_message)
-                if line.startswith("User:"):
-                    prompt += f"<|user|>\n{line[5:].strip()}</s>\n"
-                elif line.startswith("Assistant:"):
-                    prompt += f"<|assistant|>\n{line[10:].strip()}</s>\n"
-        
-        # Add current user message
-        prompt += f"<|user|>\n{user_message}</s>\n<|assistant|>\n"
-        
-        # Tokenize
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=1536)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
+        inputs, _ = _prepare_generation(model, tokenizer, device, context_text, history_text, user_message)
         
         # Generate
         with torch.no_grad():
             outputs = model.generate(
                 **inputs,
-                max_new_tokens=512,  # Increased from 256 to allow complete responses
-                temperature=0.7,
-                top_p=0.9,
-                do_sample=True,
+                **GENERATION_KWARGS,
                 pad_token_id=tokenizer.pad_token_id,
-                eos_token_id=tokenizer.eos_token_id,
-                repetition_penalty=1.1
+                eos_token_id=tokenizer.eos_token_id
             )
         
         # Decode the generated tokens (excluding the prompt)
         generated_tokens = outputs[0][inputs['input_ids'].shape[1]:]
         response = tokenizer.decode(generated_tokens, skip_special_tokens=True)
-        
-        # Clean up the response
-        response = response.strip()
-        
-        # Remove any accidental repetition of the user's question
-        if response.startswith(user_message):
-            response = response[len(user_message):].strip()
-        
-        return response if response else "I'm not sure how to answer that. Could you rephrase your question?"
+        if response.strip():
+            answer_cache.put(answer_cache_key(context_text, history_text, user_message), response)
+        return clean_response(response, user_message)
         
     except Exception as e:
         print(f"Error generating chat response: {e}")
         return f"Sorry, I encountered an error: {str(e)}. Please try again."
 
 
+class TimedStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that also records when the first new token arrived and how many were generated."""
+
+    def __init__(self, tokenizer, timeout=None):
+        super().__init__(tokenizer, skip_prompt=True, timeout=timeout, skip_special_tokens=True)
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.n_tokens = 0
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+            self.n_tokens += value.numel()
+        super().put(value)
+
+    def stats(self):
+        """Time to first token (s), generated tokens and decode speed (tokens/s after the first token)."""
+        end_time = time.perf_counter()
+        if self.first_token_time is None:
+            return {'ttft': None, 'tokens': 0, 'tokens_per_sec': 0.0, 'total': end_time - self.start_time}
+        decode_time = end_time - self.first_token_time
+        return {'ttft': self.first_token_time - self.start_time, 'tokens': self.n_tokens,
+                'tokens_per_sec': (self.n_tokens - 1) / decode_time if self.n_tokens > 1 and decode_time > 0 else 0.0,
+                'total': end_time - self.start_time}
+
+
+class StopOnEvent(StoppingCriteria):
+    """Ends generate() at the next token once event is set, e.g. when nobody reads the stream any more."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def stream_chat_answer(context_text: str, history_text: str, user_message: str, stats: dict = None,
+                       timeout: float = 120, recipes=None):
+    """
+    Streaming variant of generate_chat_answer(): yields the reply in text chunks as tokens are decoded,
+    so pages can show it with st.write_stream() instead of waiting for the whole answer.
+    model.generate runs in a background thread. When stats is given it is filled at the end with
+    'source' ('recipes', 'cache' or 'model'), 'ttft' (seconds to the first token), 'tokens',
+    'tokens_per_sec' and 'total' seconds.
+    Pass the joined text through clean_response() before storing it in the chat history.
+    With LLM_WORKER_URL set the answer is streamed from the inference worker.
+    """
+    start_time = time.perf_counter()
+    answer, source = _instant_answer(context_text, history_text, user_message, recipes)
+    if answer is not None:
+        if stats is not None:
+            elapsed = time.perf_counter() - start_time
+            stats.update(source=source, ttft=elapsed, tokens=0, tokens_per_sec=0.0, total=elapsed)
+        yield answer
+        return
+    
+    stats = {} if stats is None else stats
+    chunks = []
+    if LLM_WORKER_URL:
+        answer_stream = _stream_from_worker(context_text, history_text, user_message, stats, timeout)
+    else:
+        answer_stream = stream_local_answer(context_text, history_text, user_message, stats, timeout)
+    try:
+        for text in answer_stream:
+            chunks.append(text)
+            yield text
+    finally:
+        # Closes the inner stream right away when the caller stops reading (a Streamlit rerun or Stop)
+        answer_stream.close()
+    stats['source'] = 'model'
+    # Only complete answers are cached: an abandoned stream never gets here, failures are marked in stats
+    if _cacheable(stats, ''.join(chunks)):
+        answer_cache.put(answer_cache_key(context_text, history_text, user_message), ''.join(chunks))
+
+
+def stream_local_answer(context_text: str, history_text: str, user_message: str, stats: dict = None,
+                        timeout: float = 120):
+    """stream_chat_answer() with the model of this process."""
+    start_time = time.perf_counter()
+    try:
+        model, tokenizer, device = load_model()
+        inputs, cached_tokens = _prepare_generation(model, tokenizer, device, context_text, history_text, user_message)
+    except Exception as e:
+        print(f"Error generating chat response: {e}")
+        if stats is not None:
+            stats['error'] = str(e)
+        yield f"Sorry, I encountered an error: {str(e)}. Please try again."
+        return
+    
+    streamer = TimedStreamer(tokenizer, timeout=timeout)
+    streamer.start_time = start_time
+    errors = []
+    # Set when this generator is closed or times out, so an abandoned answer stops decoding
+    stop = threading.Event()
+    
+    def generate():
+        try:
+            with torch.no_grad():
+                model.generate(
+                    **inputs,
+                    **GENERATION_KWARGS,
+                    pad_token_id=tokenizer.pad_token_id,
+                    eos_token_id=tokenizer.eos_token_id,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([StopOnEvent(stop)])
+                )
+        except Exception as e:
+            errors.append(e)
+            # Unblock the consumer, which would otherwise wait for text that never comes
+            streamer.end()
+    
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    except Empty:
+        errors.append(TimeoutError(f"no new text within {timeout}s"))
+    finally:
+        stop.set()
+        if stats is not None:
+            stats.update(streamer.stats(), cached_tokens=cached_tokens)
+    thread.join()
+    if errors:
+        print(f"Error generating chat response: {errors[0]}")
+        if stats is not None:
+            stats['error'] = str(errors[0])
+        yield f"Sorry, I encountered an error: {str(errors[0])}. Please try again."
+
+
+class BatchStreamer(BaseStreamer):
+    """
+    Streamer for a batched generate(): decodes every row separately and passes new text to
+    on_text(row, text) word by word, as TextStreamer does for a single sequence.
+    A row stops at its first end-of-sequence token; the padding generated after it is ignored.
+    """
+
+    def __init__(self, tokenizer, batch_size, on_text):
+        self.tokenizer = tokenizer
+        self.on_text = on_text
+        self.start_time = time.perf_counter()
+        self.token_caches = [[] for _ in range(batch_size)]
+        self.print_lens = [0] * batch_size
+        self.finished = [False] * batch_size
+        self.first_token_times = [None] * batch_size
+        self.end_times = [None] * batch_size
+        self.n_tokens = [0] * batch_size
+        self.prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the (padded) prompts
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        now = time.perf_counter()
+        for row, tokens in enumerate(value.reshape(len(self.token_caches), -1).tolist()):
+            if self.finished[row]:
+                continue
+            if self.first_token_times[row] is None:
+                self.first_token_times[row] = now
+            for token in tokens:
+                self.n_tokens[row] += 1
+                if token == self.tokenizer.eos_token_id:
+                    self.finished[row] = True
+                    self.end_times[row] = now
+                    break
+                self.token_caches[row].append(token)
+            self._emit(row, final=self.finished[row])
+
+    def _emit(self, row, final=False):
+        text = self.tokenizer.decode(self.token_caches[row], skip_special_tokens=True)
+        if final or text.endswith("\n"):
+            printable_text = text[self.print_lens[row]:]
+            self.token_caches[row] = []
+            self.print_lens[row] = 0
+        else:
+            printable_text = text[self.print_lens[row]:text.rfind(" ") + 1]
+            self.print_lens[row] += len(printable_text)
+        if printable_text:
+            self.on_text(row, printable_text)
+
+    def end(self):
+        now = time.perf_counter()
+        for row in range(len(self.token_caches)):
+            if not self.finished[row]:
+                self._emit(row, final=True)
+                self.finished[row] = True
+                self.end_times[row] = now
+
+    def stats(self):
+        """One stream_chat_answer()-style stats dict per row."""
+        stats = []
+        for first_token_time, end_time, n_tokens in zip(self.first_token_times, self.end_times, self.n_tokens):
+            if first_token_time is None:
+                stats.append({'ttft': None, 'tokens': 0, 'tokens_per_sec': 0.0, 'total': end_time - self.start_time})
+                continue
+            decode_time = end_time - first_token_time
+            stats.append({'ttft': first_token_time - self.start_time, 'tokens': n_tokens,
+                          'tokens_per_sec': (n_tokens - 1) / decode_time if n_tokens > 1 and decode_time > 0 else 0.0,
+                          'total': end_time - self.start_time})
+        return stats
+
+
+def generate_local_batch(questions, on_text):
+    """
+    Answer several (context_text, history_text, user_message) questions with one batched model.generate.
+    Prompts are left-padded so every row continues right after its own prompt; on_text(i, text) receives
+    the text of answer i as it is decoded, on the calling thread. Returns one stats dict per question.
+    Pass each joined answer through clean_response().
+    A single question reuses the cached prefix key/values like stream_local_answer(); padded batches
+    prefill every prompt in full.
+    """
+    model, tokenizer, device = load_model()
+    cached_tokens = 0
+    if len(questions) == 1:
+        inputs, cached_tokens = _prepare_generation(model, tokenizer, device, *questions[0])
+    else:
+        prompts = [build_prompt(*question) for question in questions]
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"
+        try:
+            inputs = tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=1536)
+        finally:
+            tokenizer.padding_side = padding_side
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+    streamer = BatchStreamer(tokenizer, len(questions), on_text)
+    with torch.no_grad():
+        model.generate(
+            **inputs,
+            **GENERATION_KWARGS,
+            pad_token_id=tokenizer.pad_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            streamer=streamer
+        )
+    all_stats = streamer.stats()
+    all_stats[0]['cached_tokens'] = cached_tokens
+    for stats in all_stats[1:]:
+        stats['cached_tokens'] = 0
+    return all_stats
+
+
+def _stream_from_worker(context_text, history_text, user_message, stats=None, timeout=120):
+    """
+    Stream an answer from the inference worker's newline-delimited JSON /chat endpoint.
+    The worker's stats are kept, except ttft, which is measured here so that it includes queueing.
+    stats gets an 'error' when the request fails or the stream ends without the worker's stats line.
+    """
+    import requests
+    
+    start_time = time.perf_counter()
+    first_text_time = None
+    got_stats = False
+    payload = {'context_text': context_text, 'history_text': history_text, 'user_message': user_message}
+    try:
+        with requests.post(f"{LLM_WORKER_URL.rstrip('/')}/chat", json=payload, stream=True,
+                           timeout=(5, timeout)) as response:
+            if response.status_code == 503:
+                detail = response.json().get('detail', 'unavailable')
+                if stats is not None:
+                    stats['error'] = detail
+                yield f"The assistant is busy or still loading ({detail}). Please try again in a moment."
+                return
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if 'text' in message:
+                    if first_text_time is None:
+                        first_text_time = time.perf_counter()
+                    yield message['text']
+                elif 'stats' in message:
+                    got_stats = True
+                    if stats is not None:
+                        stats.update(message['stats'])
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error generating chat response: {e}")
+        if stats is not None:
+            stats['error'] = str(e)
+        yield f"Sorry, I encountered an error: {str(e)}. Please try again."
+        return
+    if not got_stats:
+        # The worker always ends an answer with its stats; without them the answer may be cut off
+        print("Error generating chat response: the worker closed the stream before its stats")
+        if stats is not None:
+            stats['error'] = "incomplete answer from the worker"
+        return
+    if stats is not None and first_text_time is not None:
+        stats['ttft'] = first_text_time - start_time
+        stats['total'] = time.perf_counter() - start_time
+
+
+def format_stream_stats(stats: dict) -> str:
+    """One-line summary of stream_chat_answer() stats for a caption under the answer."""
+    if not stats or stats.get('error') or stats.get('ttft') is None:
+        return ""
+    total = stats.get('total', 0.0)
+    if stats.get('source') == 'recipes':
+        return f"⚡ Answered from the recommendation data in {total * 1000:.0f} ms"
+    if stats.get('source') == 'cache':
+        return f"⚡ Cached answer in {total * 1000:.0f} ms"
+    return (f"⏱️ First token in {stats['ttft']:.1f}s · {stats.get('tokens', 0)} tokens at "
+            f"{stats.get('tokens_per_sec', 0.0):.1f} tokens/s · {total:.1f}s total")
+
+
 def clear_model_cache():
     """
     Clear the model from memory to free up resources.
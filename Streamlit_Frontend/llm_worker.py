@@ -0,0 +1,246 @@
+"""
+LLM inference worker
+Runs the TinyLlama assistant as one local service shared by every Streamlit session and process.
+The model is loaded and warmed up in the background at startup, chat requests wait in a bounded
+queue, and a single inference thread micro-batches them: it collects the questions arriving within
+a few milliseconds (up to a batch size), generates their answers in one left-padded batch, and
+streams each answer back to its caller as newline-delimited JSON ({"text": ...} chunks, then {"stats": ...},
+which holds an 'error' when generation failed).
+
+Run from Streamlit_Frontend/:  uvicorn llm_worker:app --host 0.0.0.0 --port 8090
+and start Streamlit with LLM_WORKER_URL=http://localhost:8090 so llm_chat uses it.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import torch
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+import llm_chat
+
+# Chat requests allowed to wait for the model; further requests are rejected with 503
+QUEUE_SIZE = int(os.environ.get('LLM_QUEUE_SIZE', 32))
+# Most questions generated together, and how long the first one waits for others to join its batch
+MAX_BATCH = int(os.environ.get('LLM_MAX_BATCH', 4))
+MAX_WAIT_MS = float(os.environ.get('LLM_MAX_WAIT_MS', 10))
+# How often a waiting stream checks whether its client has disconnected
+DISCONNECT_POLL_SECONDS = 0.25
+
+
+class ChatRequest(BaseModel):
+    context_text: str
+    history_text: str = ""
+    user_message: str
+
+
+class ChatJob:
+    """One queued question; the inference thread puts text chunks, then the stats, then None on output."""
+
+    def __init__(self, request):
+        self.request = request
+        self.output = queue.Queue()
+        self.enqueued_time = time.perf_counter()
+        self.cancelled = threading.Event()
+
+    async def stream(self, request):
+        """
+        Newline-delimited JSON lines of the answer, as they are generated.
+        While waiting for the next item it checks request.is_disconnected(), so a client that leaves while
+        its job is still queued cancels the job before the inference thread picks it up.
+        """
+        try:
+            while True:
+                try:
+                    item = await asyncio.to_thread(self.output.get, timeout=DISCONNECT_POLL_SECONDS)
+                except queue.Empty:
+                    if await request.is_disconnected():
+                        return
+                    continue
+                if item is None:
+                    return
+                yield json.dumps(item) + "\n"
+        finally:
+            # The client is gone (or done); a job still waiting in the queue is skipped
+            self.cancelled.set()
+
+
+class InferenceWorker:
+    """Owns the model: warms it up, then answers queued ChatJobs in micro-batches on a single thread."""
+
+    def __init__(self, queue_size=QUEUE_SIZE, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.ready = False
+        self.error = None
+        self.load_seconds = None
+        self.in_flight = 0
+        self.served = 0
+        self.failed = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.queued_seconds = 0.0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='llm-inference')
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def warm_up(self):
+        """Load the model and run one short generation so the first question does not pay for lazy setup."""
+        start_time = time.perf_counter()
+        model, tokenizer, device = llm_chat.load_model()
+        inputs = tokenizer(llm_chat.build_prompt("", "", "Hello"), return_tensors="pt").to(device)
+        with torch.no_grad():
+            model.generate(**inputs, max_new_tokens=2, do_sample=False, pad_token_id=tokenizer.pad_token_id)
+        self.load_seconds = time.perf_counter() - start_time
+        self.ready = True
+
+    def submit(self, request):
+        """Queue a ChatRequest; raises queue.Full when QUEUE_SIZE requests are already waiting."""
+        job = ChatJob(request)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise
+        return job
+
+    def _run(self):
+        try:
+            self.warm_up()
+        except Exception as e:
+            print(f"Error loading the chat model: {e}")
+            self.error = str(e)
+            return
+        while True:
+            batch = self._collect(self.jobs.get())
+            if batch:
+                self._answer(batch)
+
+    def _collect(self, first_job):
+        """first_job plus the jobs arriving within max_wait of it, up to max_batch, without cancelled ones."""
+        batch = [first_job]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Jobs that queued up during the previous batch are taken without waiting
+                batch.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        active = [job for job in batch if not job.cancelled.is_set()]
+        with self._lock:
+            self.skipped += len(batch) - len(active)
+        return active
+
+    def _answer(self, batch):
+        start_time = time.perf_counter()
+        with self._lock:
+            self.in_flight += len(batch)
+            self.batches += 1
+            self.queued_seconds += sum(start_time - job.enqueued_time for job in batch)
+        try:
+            questions = [(job.request.context_text, job.request.history_text, job.request.user_message) for job in batch]
+            all_stats = llm_chat.generate_local_batch(questions, lambda row, text: batch[row].output.put({'text': text}))
+            for job, stats in zip(batch, all_stats):
+                stats['queued'] = start_time - job.enqueued_time
+                stats['batch_size'] = len(batch)
+                job.output.put({'stats': stats})
+            failed = False
+        except Exception as e:
+            print(f"Error generating chat response: {e}")
+            total = time.perf_counter() - start_time
+            for job in batch:
+                job.output.put({'text': f"Sorry, I encountered an error: {str(e)}. Please try again."})
+                # The stats line marks the reply as a failure, so clients neither cache nor time it
+                job.output.put({'stats': {'error': str(e), 'ttft': None, 'tokens': 0, 'tokens_per_sec': 0.0,
+                                          'total': total, 'queued': start_time - job.enqueued_time,
+                                          'batch_size': len(batch)}})
+            failed = True
+        finally:
+            for job in batch:
+                job.output.put(None)
+            with self._lock:
+                self.in_flight -= len(batch)
+                self.busy_seconds += (time.perf_counter() - start_time) * len(batch)
+                if failed:
+                    self.failed += len(batch)
+                else:
+                    self.served += len(batch)
+
+    def metrics(self):
+        with self._lock:
+            answered = self.served + self.failed
+            return {
+                'ready': self.ready,
+                'error': self.error,
+                'load_seconds': self.load_seconds,
+                'queue_depth': self.jobs.qsize(),
+                'queue_capacity': self.jobs.maxsize,
+                'in_flight': self.in_flight,
+                'served': self.served,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'skipped': self.skipped,
+                'batches': self.batches,
+                'mean_batch_size': answered / self.batches if self.batches else None,
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'mean_answer_seconds': self.busy_seconds / answered if answered else None,
+                'mean_queued_seconds': self.queued_seconds / answered if answered else None,
+            }
+
+
+worker = InferenceWorker()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Loading runs on the inference thread, so the server answers /health/ready while the model loads
+    worker.start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/")
+def home():
+    return {"health_check": "OK"}
+
+
+@app.get("/health/ready")
+def ready():
+    """200 once the model is loaded and warmed up, 503 while loading or after a load failure."""
+    if worker.ready:
+        return {"ready": True}
+    return JSONResponse(status_code=503, content={"ready": False, "error": worker.error})
+
+
+@app.get("/metrics")
+def metrics():
+    return worker.metrics()
+
+
+@app.post("/chat")
+def chat(chat_request: ChatRequest, request: Request):
+    if worker.error:
+        return JSONResponse(status_code=503, content={"detail": "model failed to load"})
+    try:
+        job = worker.submit(chat_request)
+    except queue.Full:
+        return JSONResponse(status_code=503, content={"detail": "queue full"})
+    return StreamingResponse(job.stream(request), media_type="application/x-ndjson")
@@ -0,0 +1,129 @@
+"""
+Meal Plan Solver
+Fills every day/meal slot of a plan with a distinct recipe from one batched
+nearest-neighbour retrieval and a minimum-distance assignment
+"""
+
+import random
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+from Generate_Recommendations import RecommendationResult, get_index, load_dataset
+from shopping_list_generator import recipe_costs
+from recipe_tags import tag_mask
+
+# Assignment cost of a slot/recipe pair that is not a candidate; such assignments are discarded
+UNASSIGNABLE = 1e6
+
+
+def nutrition_target(calories, rng=random):
+    """Nutrition target for one meal, randomised (±10% calories) so that days differ."""
+    varied_calories = calories * rng.uniform(0.9, 1.1)
+    return [
+        varied_calories,  # Calories
+        varied_calories * rng.uniform(0.025, 0.035),  # Fat variation
+        varied_calories * 0.007,  # Saturated fat
+        rng.randint(40, 60),  # Cholesterol variation
+        rng.randint(350, 450),  # Sodium variation
+        varied_calories * rng.uniform(0.11, 0.15),  # Carbs variation
+        rng.randint(6, 10),  # Fiber variation
+        rng.randint(8, 12),  # Sugar variation
+        varied_calories * rng.uniform(0.045, 0.055)  # Protein variation
+    ]
+
+
+def _assign(dataset, index, targets, mask, used_names):
+    """
+    Distinct recipes (by name, none of used_names) for as many targets as possible among the rows in mask.
+    Every target retrieves its k nearest rows in one batched search and the candidates are assigned with a
+    minimum total distance. k starts just above the number of slots, which is enough unless names repeat,
+    and grows while some slot stays empty and the mask is not exhausted.
+    Returns {target position: (row, distance)}.
+    """
+    n_allowed = int(mask.sum())
+    k = min(len(targets) + 8, n_allowed)
+    while k:
+        found = index.search_batch(targets, [k] * len(targets), [None] * len(targets),
+                                   return_distance=True, allowed=[mask] * len(targets))
+        union = np.unique(np.concatenate([rows for rows, _ in found]))
+        name_codes, names = pd.factorize(dataset.take(union, ['Name'])['Name'])
+        keep = ~names.isin(list(used_names))[name_codes]
+
+        # One column per distinct recipe name so that duplicated names can only be used once
+        costs = np.full((len(targets), len(names)), UNASSIGNABLE)
+        best_rows = {}
+        for slot, (rows, distances) in enumerate(found):
+            positions = np.searchsorted(union, rows)
+            for row, distance, position in zip(rows, distances, positions):
+                code = name_codes[position]
+                if keep[position] and distance < costs[slot, code]:
+                    costs[slot, code] = distance
+                    best_rows[slot, code] = row
+        slots, codes = linear_sum_assignment(costs)
+        assigned = {slot: (best_rows[slot, code], costs[slot, code])
+                    for slot, code in zip(slots, codes) if costs[slot, code] < UNASSIGNABLE}
+        if len(assigned) == len(targets) or k >= n_allowed:
+            return assigned
+        k = min(k * 4, n_allowed)
+    return {}
+
+
+def solve_meal_plan(num_days, meal_calories, dietary_restrictions=(), cuisines=(), budget_per_meal=None,
+                    dataset=None, rng=random):
+    """
+    Assign a distinct recipe to every (day, meal) slot of a plan.
+
+    Args:
+        num_days: Number of days to plan
+        meal_calories: Dict of meal name -> calorie target, in serving order
+        dietary_restrictions: Selected restrictions and protein preferences (see recipe_tags.EXCLUDED_TAGS, PREFERRED_TAGS)
+        cuisines: Selected cuisines ('Any' or empty for all)
+        budget_per_meal: Optional maximum estimated cost per recipe
+
+    Returns:
+        tuple: (meal_plan, messages) where meal_plan maps 'Day n' -> meal name -> lightweight recipe dict
+        (call hydrate_recipes() for the full recipes) and messages lists (level, text) for the page to show
+    """
+    dataset = dataset if dataset is not None else load_dataset()
+    index = get_index(dataset)
+    slots = [(f'Day {day}', meal_name) for day in range(1, num_days + 1) for meal_name in meal_calories]
+    targets = [nutrition_target(meal_calories[meal_name], rng) for _, meal_name in slots]
+    meal_plan = {f'Day {day}': {} for day in range(1, num_days + 1)}
+    messages = []
+
+    # Restrictions, protein preferences and cuisines as one mask over the precomputed bitmask columns
+    allowed = tag_mask(dataset.columns['DietBits'], dataset.columns['CuisineBits'], dietary_restrictions, cuisines)
+    if not allowed.any():
+        messages.append(('error', "❌ No recipes match your dietary restrictions and cuisines. Try adjusting your filters or selecting 'Any' cuisine."))
+        return meal_plan, messages
+
+    passes = [allowed]
+    if budget_per_meal:
+        # Slots that cannot be filled within budget fall back to the rest of the allowed recipes
+        passes.insert(0, allowed & (recipe_costs(dataset) <= budget_per_meal))
+
+    assigned = {}
+    used_names = set()
+    for attempt, mask in enumerate(passes):
+        pending = [slot for slot in range(len(slots)) if slot not in assigned]
+        if not pending:
+            break
+        if attempt:
+            messages.append(('warning', f"⚠️ Limited options within ${budget_per_meal:.2f}/meal budget for {len(pending)} meal(s). Showing the closest alternatives."))
+        found = _assign(dataset, index, [targets[slot] for slot in pending], mask, used_names)
+        for position, (row, distance) in found.items():
+            assigned[pending[position]] = (row, distance)
+        used_names.update(dataset.take([row for row, _ in found.values()], ['Name'])['Name'])
+
+    order = sorted(assigned)
+    result = RecommendationResult(dataset, np.array([assigned[slot][0] for slot in order], dtype=np.int64),
+                                  np.array([assigned[slot][1] for slot in order], dtype=np.float64))
+    for slot, recipe in zip(order, result.records()):
+        day, meal_name = slots[slot]
+        meal_plan[day][meal_name] = recipe
+    for slot, (day, meal_name) in enumerate(slots):
+        if slot not in assigned:
+            messages.append(('warning', f"⚠️ Could not find suitable recipe for {meal_name} on {day}"))
+    return meal_plan, messages
@@ -1,10 +1,10 @@
 import streamlit as st
 import pandas as pd
-from Generate_Recommendations import Generator
+from Generate_Recommendations import Generator, hydrate_recipes
 from random import uniform as rnd
-from ImageFinder.ImageFinder import get_images_links as find_image
+from ImageFinder.ImageFinder import get_images_links_many as find_images
 from streamlit_echarts import st_echarts
-from llm_chat import generate_chat_answer
+from llm_chat import clean_response, format_stream_stats, stream_chat_answer
 from shopping_list_generator import generate_shopping_list, format_shopping_list_markdown, estimate_shopping_cost, estimate_recipe_cost
 
 st.set_page_config(page_title="Automatic Diet Recommendation", page_icon="💪",layout="wide")
@@ -94,6 +94,9 @@ class Person:
         # Calculate budget per meal - budget is now required
         budget_per_meal = self.budget_limit / len(self.meals_calories_perc)
         
+        # Build every meal's nutrition target first so all meals are answered by a single batched search
+        n_neighbors = 5
+        batch_items = []
         for meal in self.meals_calories_perc:
             meal_calories=self.meals_calories_perc[meal]*total_calories
             if meal=='breakfast':        
@@ -104,48 +107,28 @@ class Person:
                 recommended_nutrition = [meal_calories,rnd(20,40),rnd(0,4),rnd(0,30),rnd(0,400),rnd(40,75),rnd(4,20),rnd(0,10),rnd(50,175)] 
             else:
                 recommended_nutrition = [meal_calories,rnd(10,30),rnd(0,4),rnd(0,30),rnd(0,400),rnd(40,75),rnd(4,10),rnd(0,10),rnd(30,100)]
+            # The search itself only returns recipes within the meal budget (budget is required)
+            batch_items.append({'nutrition_input': recommended_nutrition, 'ingredients': [], 'params': {'n_neighbors': n_neighbors, 'return_distance': False, 'max_cost': budget_per_meal or None}})
+        # Lightweight candidates; only the recipes that are kept are hydrated below
+        batch_output = Generator.generate_batch(batch_items, lazy=True).json()['output']
+        
+        for meal, item, recommended_recipes in zip(self.meals_calories_perc, batch_items, batch_output):
+            recommended_recipes = recommended_recipes or []
             
-            # Request more recipes for budget filtering (budget is required)
-            n_neighbors = 25
-            generator=Generator(recommended_nutrition, [], {'n_neighbors': n_neighbors, 'return_distance': False})
-            recommended_recipes=generator.generate().json()['output']
+            if not recommended_recipes:
+                # Last resort: nothing within budget, show the closest recipes cheapest first
+                fallback = Generator(item['nutrition_input'], [], {'n_neighbors': n_neighbors, 'return_distance': False}).generate(lazy=True).json()['output'] or []
+                recommended_recipes = sorted(fallback, key=lambda x: estimate_recipe_cost(x))
+                st.warning(f"⚠️ No recipes found within ${budget_per_meal:.2f} budget for {meal}. Showing cheapest options.")
             
-            # Filter by budget - STRICT enforcement (budget is required)
-            if budget_per_meal:
-                filtered_recipes = []
-                for recipe in recommended_recipes:
-                    recipe_cost = estimate_recipe_cost(recipe)
-                    recipe['estimated_cost'] = recipe_cost
-                    # Strict: only include recipes within budget
-                    if recipe_cost <= budget_per_meal:
-                        filtered_recipes.append(recipe)
-                
-                # Sort by cost (cheapest first) and nutritional match
-                filtered_recipes.sort(key=lambda x: x.get('estimated_cost', 999))
-                
-                # Take top recipes within budget
-                if len(filtered_recipes) >= 5:
-                    recommended_recipes = filtered_recipes[:5]
-                elif len(filtered_recipes) > 0:
-                    # Use what we have within budget
-                    recommended_recipes = filtered_recipes
-                else:
-                    # Last resort: take 5 cheapest recipes
-                    recommended_recipes_sorted = sorted(recommended_recipes, key=lambda x: x.get('estimated_cost', 999))
-                    recommended_recipes = recommended_recipes_sorted[:5]
-                    st.warning(f"⚠️ No recipes found within ${budget_per_meal:.2f} budget for {meal}. Showing cheapest options.")
-                
-                recommended_recipes = recommended_recipes[:5]
-            else:
-                # Add cost estimates even without budget
-                for recipe in recommended_recipes:
-                    recipe['estimated_cost'] = estimate_recipe_cost(recipe)
+            for recipe in recommended_recipes:
+                recipe['estimated_cost'] = estimate_recipe_cost(recipe)
             
-            recommendations.append(recommended_recipes)
+            recommendations.append(hydrate_recipes(recommended_recipes))
         
-        for recommendation in recommendations:
-            for recipe in recommendation:
-                recipe['image_link']=find_image(recipe['Name']) 
+        all_recipes=[recipe for recommendation in recommendations for recipe in recommendation]
+        for recipe,image_link in zip(all_recipes,find_images([recipe['Name'] for recipe in all_recipes])):
+            recipe['image_link']=image_link
         return recommendations
 
 class Display:
@@ -451,6 +434,8 @@ if st.session_state.generated and st.session_state.person is not None:
                 st.markdown(f"**🙋 You:** {text}")
             else:
                 st.markdown(f"**🤖 Assistant:** {text}")
+        if st.session_state.get('diet_chat_stats'):
+            st.caption(format_stream_stats(st.session_state.diet_chat_stats))
         st.markdown("---")
     
     # Initialize clear flag
@@ -487,10 +472,20 @@ if st.session_state.generated and st.session_state.person is not None:
         
         # Get context from session
         context_text = st.session_state.get("diet_recipes_context", "No recipes context available.")
+        # The recipes themselves, by meal, for questions answered straight from the data
+        meal_names = list(st.session_state.person.meals_calories_perc.keys())
+        chat_recipes = [((meal_name,), recipe)
+                        for meal_name, meal_recipes in zip(meal_names, st.session_state.diet_recommendations or [])
+                        for recipe in meal_recipes]
         
-        # Generate answer
-        with st.spinner("🤔 Thinking..."):
-            answer = generate_chat_answer(context_text, history_text, user_question)
+        # Stream the answer as it is generated
+        st.markdown(f"**🙋 You:** {user_question}")
+        st.markdown("**🤖 Assistant:**")
+        stream_stats = {}
+        answer = st.write_stream(stream_chat_answer(context_text, history_text, user_question, stream_stats,
+                                                     recipes=chat_recipes))
+        answer = clean_response(answer, user_question)
+        st.session_state.diet_chat_stats = stream_stats
         
         # Append assistant answer
         st.session_state.diet_chat_history.append(("assistant", answer))
@@ -505,4 +500,5 @@ if st.session_state.generated and st.session_state.person is not None:
     if st.session_state.diet_chat_history:
         if st.button("Clear Chat History"):
             st.session_state.diet_chat_history = []
+            st.session_state.diet_chat_stats = {}
             st.rerun()
@@ -1,9 +1,9 @@
 import streamlit as st
-from Generate_Recommendations import Generator
-from ImageFinder.ImageFinder import get_images_links as find_image
+from Generate_Recommendations import Generator, hydrate_recipes
+from ImageFinder.ImageFinder import get_images_links_many as find_images
 import pandas as pd
 from streamlit_echarts import st_echarts
-from llm_chat import generate_chat_answer
+from llm_chat import clean_response, format_stream_stats, stream_chat_answer
 from shopping_list_generator import generate_shopping_list, format_shopping_list_markdown, estimate_shopping_cost, estimate_recipe_cost
 
 st.set_page_config(page_title="Custom Food Recommendation", page_icon="🔍",layout="wide")
@@ -43,12 +43,11 @@ class Recommendation:
         self.budget_per_recipe=budget_per_recipe
         pass
     def generate(self,):
-        # Request more recipes for budget filtering (budget is required)
-        n_neighbors = self.nb_recommendations * 3
-        params={'n_neighbors':n_neighbors,'return_distance':False}
+        # The search itself only returns recipes within the budget (budget is required)
+        params={'n_neighbors':self.nb_recommendations,'return_distance':False,'max_cost':self.budget_per_recipe or None}
         ingredients=self.ingredient_txt.split(';')
         generator=Generator(self.nutrition_list,ingredients,params)
-        recommendations=generator.generate()
+        recommendations=generator.generate(lazy=True)
         
         if recommendations and recommendations.status_code == 200:
             recommendations = recommendations.json()['output']
@@ -57,25 +56,23 @@ class Recommendation:
         
         budget_warning = None
         
+        if recommendations is not None and len(recommendations) == 0:
+            # If no recipes within budget, take the closest ones cheapest first
+            params={'n_neighbors':self.nb_recommendations,'return_distance':False}
+            recommendations = Generator(self.nutrition_list,ingredients,params).generate(lazy=True).json()['output'] or []
+            recommendations = sorted(recommendations, key=lambda x: estimate_recipe_cost(x))
+            cheapest_cost = estimate_recipe_cost(recommendations[0]) if recommendations else 0
+            budget_warning = f"⚠️ No recipes found under \\${self.budget_per_recipe:.2f}. Showing cheapest options starting from \\${cheapest_cost:.2f}."
+        
         if recommendations and len(recommendations) > 0:
             # Add cost estimates
             for recipe in recommendations:
                 recipe['estimated_cost'] = estimate_recipe_cost(recipe)
-                recipe['image_link']=find_image(recipe['Name'])
             
-            # Filter by budget - with fallback
-            if self.budget_per_recipe:
-                budget_filtered = [r for r in recommendations if r['estimated_cost'] <= self.budget_per_recipe]
-                if budget_filtered:
-                    # Only return recipes within budget
-                    recommendations = budget_filtered[:self.nb_recommendations]
-                else:
-                    # If no recipes within budget, take cheapest ones
-                    recommendations = sorted(recommendations, key=lambda x: x['estimated_cost'])[:self.nb_recommendations]
-                    cheapest_cost = recommendations[0]['estimated_cost'] if recommendations else 0
-                    budget_warning = f"⚠️ No recipes found under \\${self.budget_per_recipe:.2f}. Showing cheapest options starting from \\${cheapest_cost:.2f}."
-            else:
-                recommendations = recommendations[:self.nb_recommendations]
+            # Only the recipes that are shown get their full text and an image
+            hydrate_recipes(recommendations)
+            for recipe,image_link in zip(recommendations,find_images([recipe['Name'] for recipe in recommendations])):
+                recipe['image_link']=image_link
         
         return recommendations, budget_warning
 
@@ -310,6 +307,8 @@ if st.session_state.custom_generated:
                 st.markdown(f"**🙋 You:** {text}")
             else:
                 st.markdown(f"**🤖 Assistant:** {text}")
+        if st.session_state.get('custom_chat_stats'):
+            st.caption(format_stream_stats(st.session_state.custom_chat_stats))
         st.markdown("---")
     
     # Initialize clear flag
@@ -346,10 +345,16 @@ if st.session_state.custom_generated:
         
         # Get context from session
         context_text = st.session_state.get("custom_recipes_context", "No recipes context available.")
+        chat_recipes = [((), recipe) for recipe in st.session_state.custom_recommendations or []]
         
-        # Generate answer
-        with st.spinner("🤔 Thinking..."):
-            answer = generate_chat_answer(context_text, history_text, user_question)
+        # Stream the answer as it is generated
+        st.markdown(f"**🙋 You:** {user_question}")
+        st.markdown("**🤖 Assistant:**")
+        stream_stats = {}
+        answer = st.write_stream(stream_chat_answer(context_text, history_text, user_question, stream_stats,
+                                                     recipes=chat_recipes))
+        answer = clean_response(answer, user_question)
+        st.session_state.custom_chat_stats = stream_stats
         
         # Append assistant answer
         st.session_state.custom_chat_history.append(("assistant", answer))
@@ -364,4 +369,5 @@ if st.session_state.custom_generated:
     if st.session_state.custom_chat_history:
         if st.button("Clear Chat History"):
             st.session_state.custom_chat_history = []
+            st.session_state.custom_chat_stats = {}
             st.rerun()
\ No newline at end of file
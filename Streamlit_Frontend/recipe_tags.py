@@ -0,0 +1,79 @@
+"""
+Recipe Tags
+Per-recipe cuisine and dietary bitmasks, computed once over the whole dataset so that
+restrictions and cuisine choices become a single vectorized mask before the kNN search
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Cuisines with a bit in CuisineBits (the Cuisine values written by enhance_dataset.py and offered by the Meal Planner)
+CUISINES = ['Indian', 'Japanese', 'Italian', 'Mexican', 'Chinese', 'Thai', 'Mediterranean', 'French', 'American',
+            'Asian', 'Middle Eastern', 'Other']
+
+# DietBits: what a recipe contains, matched as substrings of its lowercased name and ingredients
+DIET_TAGS = {
+    'meat': ['beef', 'pork', 'chicken', 'meat', 'turkey', 'lamb'],
+    'fish': ['fish', 'seafood'],
+    'dairy': ['milk', 'cheese', 'butter', 'cream', 'yogurt', 'whey'],
+    'egg': ['egg'],
+    'chicken': ['chicken', 'poultry'],
+    'seafood': ['fish', 'salmon', 'tuna', 'shrimp', 'seafood', 'prawn', 'cod', 'tilapia'],
+    'beef': ['beef', 'steak', 'ground beef'],
+    'pork': ['pork', 'bacon', 'ham', 'sausage'],
+}
+DIET_BITS = {tag: 1 << position for position, tag in enumerate(DIET_TAGS)}
+# Plant-based ingredients whose names contain a DIET_TAGS keyword; they are removed from the text before tagging
+PLANT_BASED = re.compile(r'\b(?:(?:peanut|almond|cashew|nut|seed|sunflower seed|apple|cocoa|cacao|shea|soy)\s*butter|'
+                         r'(?:coconut|soy|oat|almond|rice|cashew|hemp|nut)\s*(?:milk|cream|yogurt)|'
+                         r'cream of tartar|butternut|eggplants?)')
+
+# Tags a dietary restriction rules out, and tags of which a protein preference requires at least one
+EXCLUDED_TAGS = {
+    'Vegetarian': ['meat', 'fish'],
+    'Vegan': ['meat', 'fish', 'dairy', 'egg'],
+}
+PREFERRED_TAGS = {
+    'Prefer Chicken': ['chicken'],
+    'Prefer Fish/Seafood': ['seafood'],
+    'Prefer Beef': ['beef'],
+    'Prefer Pork': ['pork'],
+}
+
+
+def diet_bits(names, ingredient_lists):
+    """DietBits (uint16) for every recipe from its names and parsed ingredient lists."""
+    texts = (pd.Series(names, dtype=object).astype(str).reset_index(drop=True) + ' ' +
+             pd.Series(list(ingredient_lists), dtype=object).str.join(' ').fillna('')).str.lower()
+    texts = texts.str.replace(PLANT_BASED, ' ', regex=True)
+    bits = np.zeros(len(texts), dtype=np.uint16)
+    for tag, keywords in DIET_TAGS.items():
+        matches = texts.str.contains('|'.join(re.escape(keyword) for keyword in keywords), regex=True)
+        bits[matches.to_numpy(dtype=bool)] |= DIET_BITS[tag]
+    return bits
+
+
+def cuisine_bits(cuisine_column):
+    """CuisineBits (uint16, one bit per CUISINES entry) for every recipe from its Cuisine value."""
+    codes = pd.Categorical(pd.Series(cuisine_column, dtype=object), categories=CUISINES).codes
+    return np.where(codes >= 0, np.left_shift(1, codes.astype(np.int64)), 0).astype(np.uint16)
+
+
+def tag_mask(diet, cuisine, dietary_restrictions=(), cuisines=()):
+    """
+    Boolean mask of the recipes compatible with the selected restrictions, protein preferences
+    and cuisines ('Any' or empty for all), from the DietBits and CuisineBits arrays.
+    """
+    mask = np.ones(len(diet), dtype=bool)
+    excluded = sum(DIET_BITS[tag] for tag in {tag for r in dietary_restrictions for tag in EXCLUDED_TAGS.get(r, [])})
+    if excluded:
+        mask &= (diet & excluded) == 0
+    preferred = sum(DIET_BITS[tag] for tag in {tag for r in dietary_restrictions for tag in PREFERRED_TAGS.get(r, [])})
+    if preferred:
+        mask &= (diet & preferred) != 0
+    if cuisines and 'Any' not in cuisines:
+        selected = sum(1 << CUISINES.index(c) for c in set(cuisines) if c in CUISINES)
+        mask &= (cuisine & selected) != 0
+    return mask
@@ -5,6 +5,8 @@ Consolidates ingredients from multiple recipes into an organized shopping list
 
 from collections import defaultdict
 import re
+import numpy as np
+import pandas as pd
 
 
 def parse_ingredient(ingredient_text):
@@ -290,6 +292,61 @@ def format_shopping_list_markdown(shopping_list):
     return markdown
 
 
+# Simple price estimates (in USD per typical ingredient amount); the first key found in an ingredient wins
+RECIPE_PRICES = {
+    'chicken': 3.5,
+    'beef': 5.5,
+    'pork': 4.0,
+    'turkey': 4.5,
+    'fish': 6.5,
+    'salmon': 8.0,
+    'shrimp': 9.0,
+    'tuna': 3.0,
+    'cheese': 4.5,
+    'milk': 2.5,
+    'cream': 3.5,
+    'butter': 3.0,
+    'egg': 2.5,
+    'rice': 2.0,
+    'pasta': 1.8,
+    'bread': 2.5,
+    'flour': 2.0,
+    'sugar': 2.5,
+    'oil': 3.5,
+    'olive oil': 6.0,
+    'tomato': 2.0,
+    'onion': 1.5,
+    'garlic': 1.0,
+    'potato': 2.0,
+    'carrot': 1.5,
+    'broccoli': 2.5,
+    'spinach': 2.5,
+    'lettuce': 2.0,
+    'pepper': 2.5,
+    'mushroom': 3.0,
+    'avocado': 2.0,
+    'lemon': 1.0,
+    'lime': 1.0,
+    'apple': 3.0,
+    'banana': 2.0,
+    'berry': 4.0,
+    'herbs': 2.5,
+    'spice': 3.0,
+    'sauce': 2.5,
+    'broth': 2.0,
+    'stock': 2.5,
+    'wine': 8.0,
+    'vinegar': 2.5
+}
+
+
+def _recipe_prices(price_database=None):
+    prices = dict(RECIPE_PRICES)
+    if price_database:
+        prices.update(price_database)
+    return prices
+
+
 def estimate_recipe_cost(recipe, price_database=None):
     """
     Estimate cost of a single recipe.
@@ -299,57 +356,13 @@ def estimate_recipe_cost(recipe, price_database=None):
         price_database: Optional dict of ingredient prices
         
     Returns:
-        float: Estimated recipe cost
+        float: Estimated recipe cost (the precomputed 'EstimatedCost' when the recipe
+        carries one and no price_database is given)
     """
-    # Simple price estimates (in USD per typical ingredient amount)
-    default_prices = {
-        'chicken': 3.5,
-        'beef': 5.5,
-        'pork': 4.0,
-        'turkey': 4.5,
-        'fish': 6.5,
-        'salmon': 8.0,
-        'shrimp': 9.0,
-        'tuna': 3.0,
-        'cheese': 4.5,
-        'milk': 2.5,
-        'cream': 3.5,
-        'butter': 3.0,
-        'egg': 2.5,
-        'rice': 2.0,
-        'pasta': 1.8,
-        'bread': 2.5,
-        'flour': 2.0,
-        'sugar': 2.5,
-        'oil': 3.5,
-        'olive oil': 6.0,
-        'tomato': 2.0,
-        'onion': 1.5,
-        'garlic': 1.0,
-        'potato': 2.0,
-        'carrot': 1.5,
-        'broccoli': 2.5,
-        'spinach': 2.5,
-        'lettuce': 2.0,
-        'pepper': 2.5,
-        'mushroom': 3.0,
-        'avocado': 2.0,
-        'lemon': 1.0,
-        'lime': 1.0,
-        'apple': 3.0,
-        'banana': 2.0,
-        'berry': 4.0,
-        'herbs': 2.5,
-        'spice': 3.0,
-        'sauce': 2.5,
-        'broth': 2.0,
-        'stock': 2.5,
-        'wine': 8.0,
-        'vinegar': 2.5
-    }
+    if not price_database and recipe.get('EstimatedCost') is not None:
+        return float(recipe['EstimatedCost'])
     
-    if price_database:
-        default_prices.update(price_database)
+    default_prices = _recipe_prices(price_database)
     
     ingredients = recipe.get('RecipeIngredientParts', [])
     if not ingredients:
@@ -382,6 +395,103 @@ def estimate_recipe_cost(recipe, price_database=None):
     return round(total_cost, 2)
 
 
+
+def _row_costs(rows, item_keys, prices, n_rows):
+    """estimate_recipe_cost() for many recipes at once from flat (recipe row, matched price key) item arrays."""
+    matched = item_keys >= 0
+    # Each matched ingredient contributes 30% of its base price, unknown ones a flat 1.5
+    item_costs = np.where(matched, prices[np.maximum(item_keys, 0)] * 0.3, 1.5)
+    totals = np.bincount(rows, weights=item_costs, minlength=n_rows)
+    counts = np.bincount(rows, minlength=n_rows)
+    matched_counts = np.bincount(rows, weights=matched, minlength=n_rows)
+    totals = np.where(matched_counts < counts * 0.3, np.maximum(totals, counts * 1.2), totals)
+    return np.round(np.where(counts == 0, 5.0, totals), 2)
+
+
+def _match_price_keys(vocabulary, keys, key_of=None, offset=0):
+    """
+    Index of the first key contained in each ingredient string (-1 if none), scanning each key
+    once over the distinct strings rather than every key for every ingredient occurrence.
+    Only entries of key_of that are still -1 are matched, against keys numbered from offset.
+    """
+    key_of = np.full(len(vocabulary), -1, dtype=np.int64) if key_of is None else key_of.copy()
+    for i, key in enumerate(keys):
+        unmatched = np.flatnonzero(key_of < 0)
+        if not len(unmatched):
+            break
+        hits = vocabulary[unmatched].str.contains(key, regex=False)
+        key_of[unmatched[np.asarray(hits, dtype=bool)]] = offset + i
+    return key_of
+
+
+class RecipeCostTable:
+    """
+    Vectorized estimate_recipe_cost() over a whole dataset of ingredient lists.
+    costs holds one estimate per recipe with the default prices; with_prices() answers a
+    price_database override by recomputing only the recipes whose ingredients it touches.
+    """
+    
+    def __init__(self, ingredient_lists):
+        items = pd.Series(list(ingredient_lists), dtype=object).explode()
+        items = items[items.notna()]
+        self.n_rows = len(ingredient_lists)
+        self.item_rows = items.index.to_numpy(dtype=np.int64)
+        self.item_codes, vocabulary = pd.factorize(items.astype(str).str.lower())
+        self.vocabulary = pd.Series(vocabulary, dtype=object)
+        self.keys = list(RECIPE_PRICES)
+        self.prices = np.array(list(RECIPE_PRICES.values()), dtype=np.float64)
+        self.key_of = _match_price_keys(self.vocabulary, self.keys)
+        self.costs = _row_costs(self.item_rows, self.key_of[self.item_codes], self.prices, self.n_rows)
+    
+    def with_prices(self, price_database):
+        """Per-recipe costs under price_database (merged over the defaults like estimate_recipe_cost())."""
+        if not price_database:
+            return self.costs
+        prices = _recipe_prices(price_database)
+        new_keys = [key for key in prices if key not in RECIPE_PRICES]
+        price_array = np.array(list(prices.values()), dtype=np.float64)
+        # Changed prices only affect ingredients already matched to that key; new keys come last
+        # in the merged order, so they can only claim ingredients no default key matched
+        changed = np.flatnonzero(price_array[:len(self.keys)] != self.prices)
+        key_of = _match_price_keys(self.vocabulary, new_keys, self.key_of, offset=len(self.keys))
+        affected_codes = np.flatnonzero(np.isin(self.key_of, changed) | (key_of != self.key_of))
+        if not len(affected_codes):
+            return self.costs
+        affected_items = np.isin(self.item_codes, affected_codes)
+        affected_rows = np.unique(self.item_rows[affected_items])
+        selected = np.isin(self.item_rows, affected_rows)
+        costs = self.costs.copy()
+        costs[affected_rows] = _row_costs(np.searchsorted(affected_rows, self.item_rows[selected]),
+                                          key_of[self.item_codes[selected]], price_array, len(affected_rows))
+        return costs
+
+
+_cost_table_cache = {}
+
+
+def get_cost_table(dataset):
+    """Return the RecipeCostTable for dataset, building it on first use (only needed for price_database overrides)."""
+    entry = _cost_table_cache.get(id(dataset))
+    if entry is None or entry[0] is not dataset:
+        entry = (dataset, RecipeCostTable(dataset.column('RecipeIngredientParts')))
+        _cost_table_cache[id(dataset)] = entry
+    return entry[1]
+
+
+def recipe_costs(dataset, price_database=None):
+    """Estimated cost of every recipe, with only the recipes touched by price_database recomputed."""
+    if not price_database and 'EstimatedCost' in dataset.columns:
+        return dataset.columns['EstimatedCost']
+    return get_cost_table(dataset).with_prices(price_database)
+
+
+def budget_mask(dataset, params):
+    """Boolean mask of the recipes within params['max_cost'] (optionally under params['price_database']), or None."""
+    if params.get('max_cost') is None:
+        return None
+    return recipe_costs(dataset, params.get('price_database')) <= params['max_cost']
+
+
 def estimate_shopping_cost(shopping_list, price_database=None):
     """
     Estimate total shopping cost (basic implementation).
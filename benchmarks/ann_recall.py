@@ -0,0 +1,86 @@
+"""
+Recall and latency of the recommender's search backends against the exact result.
+
+Queries are dataset rows with every nutrient scaled by a random factor in [0.8, 1.2], so they look like
+real nutrition targets. For each backend setting the benchmark reports the mean and p95 latency of
+RecipeIndex.search() and recall@k, the share of the exact k nearest recipes it returned.
+'exact' is the brute-force default; 'ivf' is listed once per --probes value.
+--rows resamples the dataset to that many recipes (each nutrient scaled in [0.8, 1.2] again) to see how
+both backends scale; on small datasets the fixed cost per query dominates and ivf gains little.
+
+Usage: python benchmarks/ann_recall.py [--data-dir Data] [--rows 0] [--queries 500] [--k 10] [--lists 0]
+                                       [--probes 1 2 4 8 16 32]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'FastAPI_Backend'))
+
+from dataset_store import NUTRITION_COLUMNS, RecipeStore, load_dataset  # noqa: E402
+from recipe_index import IVFBackend, RecipeIndex  # noqa: E402
+
+
+def time_searches(index, queries, k, **options):
+    """(results, per-query latencies in ms) of index.search() over queries."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, k, **options))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+def resample(dataset, n_rows, rng):
+    """An in-memory dataset of n_rows nutrition vectors drawn from dataset with every nutrient scaled by [0.8, 1.2]."""
+    nutrition = np.asarray(dataset.nutrition)[rng.integers(0, len(dataset), n_rows)]
+    frame = pd.DataFrame(nutrition * rng.uniform(0.8, 1.2, nutrition.shape), columns=NUTRITION_COLUMNS)
+    frame['RecipeIngredientParts'] = 'c()'
+    return RecipeStore.from_dataframe(frame)
+
+
+def recall(results, exact, k):
+    return float(np.mean([len(np.intersect1d(found, truth)) / k for found, truth in zip(results, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'Data'))
+    parser.add_argument('--rows', type=int, default=0, help='resample the dataset to this many recipes')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=0, help='IVF lists (default about sqrt(rows))')
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.data_dir, csv_names=('dataset_enhanced.csv', 'dataset.csv'))
+    rng = np.random.default_rng(args.seed)
+    if args.rows:
+        dataset = resample(dataset, args.rows, rng)
+    index = RecipeIndex(dataset)
+    rows = rng.integers(0, len(dataset), args.queries)
+    queries = np.asarray(dataset.nutrition)[rows] * rng.uniform(0.8, 1.2, (args.queries, dataset.nutrition.shape[1]))
+
+    start = time.perf_counter()
+    index.backends['ivf'] = IVFBackend(index, n_lists=args.lists or None)
+    print(f"{len(dataset)} recipes, IVF with {index.backends['ivf'].n_lists} lists ready in "
+          f"{time.perf_counter() - start:.2f}s, {args.queries} queries, k={args.k}")
+
+    exact, latencies = time_searches(index, queries, args.k, backend='exact')
+    print(f"{'backend':<16}{'mean ms':>10}{'p95 ms':>10}{'recall':>10}")
+    print(f"{'exact':<16}{latencies.mean():>10.3f}{np.percentile(latencies, 95):>10.3f}{1.0:>10.3f}")
+    for n_probe in args.probes:
+        results, latencies = time_searches(index, queries, args.k, backend='ivf', n_probe=n_probe)
+        print(f"{f'ivf n_probe={n_probe}':<16}{latencies.mean():>10.3f}{np.percentile(latencies, 95):>10.3f}"
+              f"{recall(results, exact, args.k):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
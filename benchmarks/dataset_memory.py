@@ -0,0 +1,108 @@
+"""
+Peak and steady-state memory of the ways the recipe dataset can be loaded.
+
+Each mode runs in a fresh interpreter so the numbers do not include the other modes:
+  csv      pd.read_csv of every column into memory (RecipeStore.from_dataframe)
+  chunked  chunked ingestion into a temporary on-disk store, then opened with only nutrition and ids resident;
+           run once per --chunksizes value, since the chunk size bounds the ingestion peak
+  store    an existing Data/dataset_store opened memory-mapped
+
+Steady-state RSS is measured after loading, scaling the nutrition matrix and fetching 25 recipes;
+peak RSS is the process high-water mark. Linux only (/proc/self/status).
+
+Usage: python benchmarks/dataset_memory.py [--data-dir Data] [--csv dataset.csv] [--chunksizes 1000 2000 5000 20000]
+                                           [--modes csv chunked store]
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'FastAPI_Backend'))
+
+
+def memory_mb():
+    """(current RSS, peak RSS) of this process in MB."""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                key, amount, _ = line.split()
+                values[key[:-1]] = int(amount) / 1024
+    return values['VmRSS'], values['VmHWM']
+
+
+def run_mode(mode, data_dir, csv_name, chunksize):
+    # Imported before the baseline so that module memory is not counted
+    import numpy as np  # noqa: F401
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler  # noqa: F401
+
+    from dataset_store import RecipeStore, store_path
+
+    baseline, _ = memory_mb()
+    start = time.time()
+    csv_path = os.path.join(data_dir, csv_name)
+    if mode == 'csv':
+        dataset = RecipeStore.from_dataframe(pd.read_csv(csv_path, compression='gzip'))
+    elif mode == 'chunked':
+        with tempfile.TemporaryDirectory(prefix='bench_store_') as directory:
+            path = os.path.join(directory, 'dataset_store')
+            RecipeStore.build_from_csv(csv_path, path, chunksize=chunksize)
+            dataset = RecipeStore.open(path, resident=('nutrition', 'RecipeId'))
+            return measure(f'chunked/{chunksize}', dataset, baseline, start)
+    else:
+        dataset = RecipeStore.open(store_path(data_dir))
+    return measure(mode, dataset, baseline, start)
+
+
+def measure(mode, dataset, baseline, start):
+    import numpy as np
+    from sklearn.preprocessing import StandardScaler
+
+    load_seconds = time.time() - start
+    StandardScaler().fit_transform(dataset.nutrition)
+    dataset.take(np.arange(0, len(dataset), max(1, len(dataset) // 25))[:25])
+    gc.collect()
+    steady, peak = memory_mb()
+    return {'mode': mode, 'rows': len(dataset), 'load_s': round(load_seconds, 2),
+            'steady_mb': round(steady - baseline, 1), 'peak_mb': round(peak - baseline, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'Data'))
+    parser.add_argument('--csv', default='dataset.csv', help='gzipped CSV inside the data directory')
+    parser.add_argument('--chunksizes', type=int, nargs='+', default=[1000, 2000, 5000, 20000],
+                        help='rows per chunk for the chunked mode, one run each')
+    parser.add_argument('--chunksize', type=int, help=argparse.SUPPRESS)  # set for the chunked child run
+    parser.add_argument('--modes', nargs='+', default=['csv', 'chunked', 'store'], choices=['csv', 'chunked', 'store'])
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.data_dir, args.csv, args.chunksize)))
+        return
+
+    print(f"{'mode':<16}{'rows':>10}{'load s':>10}{'steady MB':>12}{'peak MB':>10}")
+    for mode in args.modes:
+        if mode == 'store' and not os.path.exists(os.path.join(args.data_dir, 'dataset_store', 'manifest.json')):
+            print(f"{mode:<16}  skipped, run build_dataset_store.py first")
+            continue
+        for chunksize in args.chunksizes if mode == 'chunked' else [None]:
+            command = [sys.executable, __file__, '--child', mode, '--data-dir', args.data_dir, '--csv', args.csv]
+            if chunksize:
+                command += ['--chunksize', str(chunksize)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['mode']:<16}{result['rows']:>10}{result['load_s']:>10}{result['steady_mb']:>12}{result['peak_mb']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Throughput of the LLM inference worker's micro-batching at different batch sizes.
+
+N questions are submitted at once to an InferenceWorker (the scheduler behind llm_worker.py, without HTTP)
+for each --batch-sizes value, and the benchmark reports wall time, generated tokens per second over all
+answers, mean time to first token and mean answer latency. Batch size 1 is the unbatched baseline.
+
+Usage: python benchmarks/llm_batching.py [--questions 8] [--batch-sizes 1 2 4 8] [--max-wait-ms 10]
+                                        [--max-new-tokens 64] [--model TinyLlama/TinyLlama-1.1B-Chat-v1.0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Streamlit_Frontend'))
+
+CONTEXT = """1. Grilled Chicken Salad - 420 kcal, 35g protein, 12g fat. Ingredients: chicken breast, lettuce, tomato, olive oil
+2. Lentil Soup - 310 kcal, 18g protein, 6g fat. Ingredients: lentils, carrot, onion, celery, cumin
+3. Salmon with Rice - 560 kcal, 32g protein, 18g fat. Ingredients: salmon, rice, lemon, garlic"""
+
+QUESTIONS = [
+    "Can I replace the chicken with tofu?",
+    "Which recipe has the most protein?",
+    "Is the lentil soup vegetarian?",
+    "How can I make the salmon dish lower in fat?",
+    "What can I use instead of rice?",
+    "Which meal is best before a workout?",
+    "Can I freeze the lentil soup?",
+    "Suggest a side dish for the salad.",
+]
+
+
+def run(worker_class, request_class, n_questions, batch_size, max_wait_ms):
+    worker = worker_class(queue_size=n_questions, max_batch=batch_size, max_wait_ms=max_wait_ms)
+    worker.ready = True  # the model is already warm, skip warm_up()
+    worker.warm_up = lambda: None
+    start = time.perf_counter()
+    jobs = [worker.submit(request_class(context_text=CONTEXT, user_message=QUESTIONS[i % len(QUESTIONS)]))
+            for i in range(n_questions)]
+    worker.start()
+    first_texts, finishes, tokens = [], [], 0
+    for job in jobs:
+        first_text = None
+        while True:
+            item = job.output.get()
+            if item is None:
+                break
+            if 'text' in item and first_text is None:
+                first_text = time.perf_counter()
+            if 'stats' in item:
+                tokens += item['stats']['tokens']
+        first_texts.append((first_text or time.perf_counter()) - start)
+        finishes.append(time.perf_counter() - start)
+    wall = time.perf_counter() - start
+    return {'wall_s': wall, 'tokens': tokens, 'tokens_per_sec': tokens / wall,
+            'mean_ttft_s': sum(first_texts) / len(first_texts), 'mean_latency_s': sum(finishes) / len(finishes),
+            'batches': worker.batches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=8)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--model', help='model id or directory (default: LLM_MODEL_NAME or TinyLlama)')
+    args = parser.parse_args()
+
+    if args.model:
+        os.environ['LLM_MODEL_NAME'] = args.model
+    import llm_chat
+    from llm_worker import ChatRequest, InferenceWorker
+
+    llm_chat.GENERATION_KWARGS['max_new_tokens'] = args.max_new_tokens
+    start = time.perf_counter()
+    InferenceWorker().warm_up()
+    print(f"{llm_chat.LLM_MODEL_NAME} loaded in {time.perf_counter() - start:.1f}s, {args.questions} questions, "
+          f"up to {args.max_new_tokens} new tokens each")
+
+    print(f"{'batch':>6}{'batches':>9}{'wall s':>9}{'tokens':>8}{'tok/s':>9}{'ttft s':>9}{'latency s':>11}")
+    for batch_size in args.batch_sizes:
+        result = run(InferenceWorker, ChatRequest, args.questions, batch_size, args.max_wait_ms)
+        print(f"{batch_size:>6}{result['batches']:>9}{result['wall_s']:>9.2f}{result['tokens']:>8}"
+              f"{result['tokens_per_sec']:>9.1f}{result['mean_ttft_s']:>9.2f}{result['mean_latency_s']:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
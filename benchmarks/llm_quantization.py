@@ -0,0 +1,122 @@
+"""
+Memory, speed and answer similarity of the chat model's int8 CPU mode against float32.
+
+Each mode (LLM_QUANTIZE unset, then "int8") loads the model in a fresh subprocess and answers the same
+questions with greedy decoding, so the answers are deterministic and comparable. The benchmark reports
+the resident memory after loading and at peak, load time, generated tokens per second, and how close the
+int8 answers are to the float32 ones: the share of identical leading tokens and the difflib text ratio.
+
+Usage: python benchmarks/llm_quantization.py [--questions 8] [--max-new-tokens 64]
+                                             [--model TinyLlama/TinyLlama-1.1B-Chat-v1.0]
+"""
+
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Streamlit_Frontend'))
+
+from llm_batching import CONTEXT, QUESTIONS  # noqa: E402
+
+MODES = ('float32', 'int8')
+
+
+def memory_mb():
+    """(current, peak) resident set size of this process in MB, from /proc (Linux)."""
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                key, amount = line.split(':')
+                values[key] = int(amount.split()[0]) / 1024
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+def run_mode(n_questions, max_new_tokens):
+    """Load the model as configured by the environment and answer the questions; prints one JSON line."""
+    import torch
+    import llm_chat
+
+    start = time.perf_counter()
+    model, tokenizer, device = llm_chat.load_model()
+    load_seconds = time.perf_counter() - start
+    rss_loaded, _ = memory_mb()
+
+    answers, tokens, seconds = [], 0, 0.0
+    for i in range(n_questions):
+        prompt = llm_chat.build_prompt(CONTEXT, "", QUESTIONS[i % len(QUESTIONS)])
+        inputs = tokenizer(prompt, return_tensors="pt").to(device)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                    pad_token_id=tokenizer.pad_token_id)
+        seconds += time.perf_counter() - start
+        new_tokens = output[0][inputs['input_ids'].shape[1]:].tolist()
+        tokens += len(new_tokens)
+        answers.append({'tokens': new_tokens, 'text': tokenizer.decode(new_tokens, skip_special_tokens=True)})
+
+    _, rss_peak = memory_mb()
+    print(json.dumps({'load_s': load_seconds, 'rss_loaded_mb': rss_loaded, 'rss_peak_mb': rss_peak,
+                      'tokens': tokens, 'tokens_per_sec': tokens / seconds if seconds else 0.0,
+                      'answers': answers}))
+
+
+def token_agreement(tokens, reference):
+    """Share of the reference answer's tokens matched before the first divergence."""
+    if not reference:
+        return 1.0 if not tokens else 0.0
+    same = 0
+    for token, expected in zip(tokens, reference):
+        if token != expected:
+            break
+        same += 1
+    return same / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=8)
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--model', help='model id or directory (default: LLM_MODEL_NAME or TinyLlama)')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)  # set for the per-mode subprocess
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.questions, args.max_new_tokens)
+        return
+
+    results = {}
+    for mode in MODES:
+        env = dict(os.environ, LLM_QUANTIZE='int8' if mode == 'int8' else '')
+        if args.model:
+            env['LLM_MODEL_NAME'] = args.model
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                  '--questions', str(args.questions), '--max-new-tokens', str(args.max_new_tokens)],
+                                 env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            sys.exit(f"{mode} run failed:\n{process.stderr}")
+        # The model loader prints progress; the result is the last line
+        results[mode] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    print(f"{args.model or os.environ.get('LLM_MODEL_NAME', 'default model')}, {args.questions} questions, "
+          f"up to {args.max_new_tokens} new tokens each, greedy decoding")
+    print(f"{'mode':<9}{'load s':>8}{'RSS MB':>9}{'peak MB':>9}{'tokens':>8}{'tok/s':>9}{'same tok':>10}{'text sim':>10}")
+    reference = results['float32']['answers']
+    for mode in MODES:
+        result = results[mode]
+        agreement = [token_agreement(answer['tokens'], expected['tokens'])
+                     for answer, expected in zip(result['answers'], reference)]
+        similarity = [difflib.SequenceMatcher(None, answer['text'], expected['text']).ratio()
+                      for answer, expected in zip(result['answers'], reference)]
+        print(f"{mode:<9}{result['load_s']:>8.1f}{result['rss_loaded_mb']:>9.0f}{result['rss_peak_mb']:>9.0f}"
+              f"{result['tokens']:>8}{result['tokens_per_sec']:>9.1f}"
+              f"{sum(agreement) / len(agreement):>10.3f}{sum(similarity) / len(similarity):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
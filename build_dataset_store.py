@@ -0,0 +1,69 @@
+"""
+Convert the gzipped recipe CSV into the memory-mapped columnar store read by the
+FastAPI backend and the Streamlit app (Data/dataset_store), including the
+prebuilt recipe and ingredient indexes, IVF lists, per-recipe cost estimates and
+cuisine/dietary bitmasks, so neither has to parse the CSV or fit anything at
+startup and every worker process memory-maps the same copy.
+
+Usage: python build_dataset_store.py [--source Data/dataset_enhanced.csv] [--output Data/dataset_store]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'FastAPI_Backend'))
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Streamlit_Frontend'))
+
+from dataset_store import RecipeStore, store_path  # noqa: E402
+from recipe_index import RecipeIndex  # noqa: E402
+from shopping_list_generator import RecipeCostTable  # noqa: E402
+from recipe_tags import cuisine_bits, diet_bits  # noqa: E402
+
+
+def default_source():
+    for name in ('dataset_enhanced.csv', 'dataset.csv'):
+        path = os.path.join('Data', name)
+        if os.path.exists(path):
+            return path
+    return os.path.join('Data', 'dataset.csv')
+
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--source', default=default_source(), help='gzipped recipe CSV to convert')
+parser.add_argument('--output', default=store_path('Data'), help='store directory to write')
+args = parser.parse_args()
+
+start = time.time()
+print(f"Loading {args.source}...")
+df = pd.read_csv(args.source, compression='gzip')
+if 'Cuisine' not in df.columns:
+    df['Cuisine'] = 'Other'
+print(f"Dataset shape: {df.shape}")
+
+print("Parsing ingredient and instruction lists...")
+store = RecipeStore.from_dataframe(df)
+
+print("Estimating recipe costs...")
+store.columns['EstimatedCost'] = RecipeCostTable(store.column('RecipeIngredientParts')).costs
+
+print("Tagging cuisine and dietary bitmasks...")
+store.columns['DietBits'] = diet_bits(store.column('Name'), store.column('RecipeIngredientParts'))
+store.columns['CuisineBits'] = cuisine_bits(store.column('Cuisine'))
+
+if os.path.exists(os.path.join(args.output, 'manifest.json')):
+    # Index arrays saved next to a previous store would no longer match the new columns
+    shutil.rmtree(args.output)
+print(f"Writing columns to {args.output}...")
+store.save(args.output)
+
+print("Building recipe and ingredient indexes and IVF lists...")
+store = RecipeStore.open(args.output)
+# The IVF lists for the configured IVF_LISTS, so the 'ivf' backend never trains at request time
+RecipeIndex(store).backend('ivf')
+
+print(f"Done in {time.time() - start:.1f}s. Columns: {store.column_names}")
@@ -1,10 +1,29 @@
-import pandas as pd
-import re
+"""
+Tag every recipe of Data/dataset.csv with a Cuisine and write Data/dataset_enhanced.csv.
+
+A recipe scores one point per distinct keyword of a cuisine found in its lowercased name and
+ingredients; the best cuisine wins with a score of at least 2 (or 1 when the cuisine is named in
+the recipe name), otherwise it is 'Other'. Each cuisine's keywords are compiled into one
+alternation regex that finds the few rows worth scoring, and chunks of rows are tagged in parallel.
+
+Runs are incremental: the per-cuisine scores are kept in a state file next to the output together
+with a content hash of every source row and a hash of every cuisine's rules, so only new or edited
+rows and cuisines whose keywords changed are rescored. When existing rows keep their tags the new
+rows are appended to the output instead of rewriting it. --full ignores the state.
 
-print("Loading dataset...")
-df = pd.read_csv('Data/dataset.csv', compression='gzip')
+Usage: python enhance_dataset.py [--input Data/dataset.csv] [--output Data/dataset_enhanced.csv] [--jobs N] [--chunk-size ROWS] [--full]
+"""
 
-print(f"Original dataset shape: {df.shape}")
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
 
 # Define cuisine detection patterns
 cuisine_patterns = {
@@ -49,59 +68,224 @@ cuisine_patterns = {
     ]
 }
 
-print("\nDetecting cuisines...")
-
-def detect_cuisine(row):
-    """Detect cuisine type based on name and ingredients"""
-    text = f"{row['Name']} {row['RecipeIngredientParts']}".lower()
-    
-    cuisine_scores = {}
-    for cuisine, keywords in cuisine_patterns.items():
-        score = sum(1 for keyword in keywords if keyword in text)
-        if score > 0:
-            cuisine_scores[cuisine] = score
-    
-    if cuisine_scores:
-        # Return cuisine with highest score
-        best_cuisine = max(cuisine_scores, key=cuisine_scores.get)
-        # Only return if score is at least 2 for authenticity
-        if cuisine_scores[best_cuisine] >= 2:
-            return best_cuisine
-        # Or if it's 1 but cuisine name is in the recipe name
-        elif cuisine_scores[best_cuisine] >= 1 and best_cuisine.lower() in row['Name'].lower():
-            return best_cuisine
-    
-    return 'Other'
-
-# Apply cuisine detection
-print("Processing recipes (this may take a few minutes)...")
-df['Cuisine'] = df.apply(detect_cuisine, axis=1)
-
-# Show statistics
-print("\n" + "="*80)
-print("CUISINE DISTRIBUTION:")
-print("="*80)
-cuisine_counts = df['Cuisine'].value_counts()
-print(cuisine_counts)
-
-# Show examples for each cuisine
-print("\n" + "="*80)
-print("SAMPLE RECIPES BY CUISINE:")
-print("="*80)
-for cuisine in ['Indian', 'Japanese', 'Italian', 'Mexican', 'Chinese', 'Thai', 'Mediterranean', 'French', 'American']:
-    cuisine_recipes = df[df['Cuisine'] == cuisine]
-    if len(cuisine_recipes) > 0:
-        print(f"\n{cuisine} ({len(cuisine_recipes)} recipes):")
-        for name in cuisine_recipes['Name'].head(5):
-            print(f"  - {name}")
-
-# Save enhanced dataset
-print("\n" + "="*80)
-print("SAVING ENHANCED DATASET...")
-print("="*80)
-output_file = 'Data/dataset_enhanced.csv'
-df.to_csv(output_file, index=False, compression='gzip')
-print(f"Saved to {output_file}")
-print(f"Dataset now has {len(df.columns)} columns: {df.columns.tolist()}")
-print(f"Total recipes: {len(df)}")
-print("\nDone! Now update the code to use this enhanced dataset.")
+CUISINE_NAMES = list(cuisine_patterns)
+CUISINE_REGEXES = {cuisine: re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+                   for cuisine, keywords in cuisine_patterns.items()}
+# Bump when the scoring itself (not a keyword list) changes, so saved scores are not reused
+SCORING_VERSION = 1
+
+
+def rules_hashes():
+    """Hash of every cuisine's keyword list and the scoring version."""
+    return {cuisine: hashlib.sha1(json.dumps([SCORING_VERSION, keywords]).encode('utf-8')).hexdigest()
+            for cuisine, keywords in cuisine_patterns.items()}
+
+
+def row_hashes(df):
+    """64-bit content hash of every source row."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def recipe_texts(names, ingredients):
+    return (names.astype(str) + ' ' + ingredients.astype(str)).str.lower().reset_index(drop=True)
+
+
+def score_cuisines(texts, cuisines=CUISINE_NAMES):
+    """(rows, cuisines) matrix of how many distinct keywords of each cuisine every text contains."""
+    scores = np.zeros((len(texts), len(cuisines)), dtype=np.int16)
+    for j, cuisine in enumerate(cuisines):
+        # One regex pass finds the rows mentioning the cuisine at all; only those are scored keyword by keyword
+        hits = np.flatnonzero(texts.str.contains(CUISINE_REGEXES[cuisine]).to_numpy(dtype=bool))
+        if not len(hits):
+            continue
+        hit_texts = texts.iloc[hits]
+        for keyword in cuisine_patterns[cuisine]:
+            scores[hits, j] += hit_texts.str.contains(keyword, regex=False).to_numpy(dtype=bool)
+    return scores
+
+
+def choose_cuisines(names, scores):
+    """Cuisine for every recipe from its Name and its (rows, CUISINE_NAMES) score matrix."""
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(best)), best]
+    lower_names = names.astype(str).str.lower().to_numpy(dtype=object)
+    # Only return if score is at least 2 for authenticity, or 1 with the cuisine name in the recipe name
+    named = np.array([CUISINE_NAMES[b].lower() in name for b, name in zip(best, lower_names)], dtype=bool)
+    keep = (best_scores >= 2) | ((best_scores >= 1) & named)
+    return np.where(keep, np.array(CUISINE_NAMES, dtype=object)[best], 'Other')
+
+
+def detect_cuisines(names, ingredients):
+    """Cuisine for every recipe from its Name and raw RecipeIngredientParts values (Series, same index)."""
+    return choose_cuisines(names, score_cuisines(recipe_texts(names, ingredients)))
+
+
+def _score_chunk(chunk):
+    names, ingredients, cuisines = chunk
+    return score_cuisines(recipe_texts(names, ingredients), cuisines)
+
+
+def score_recipes(df, cuisines=CUISINE_NAMES, jobs=1, chunk_size=50000):
+    """score_cuisines() for the rows of df, in chunks of chunk_size rows across jobs processes."""
+    chunks = [(df['Name'].iloc[start:start + chunk_size], df['RecipeIngredientParts'].iloc[start:start + chunk_size], cuisines)
+              for start in range(0, len(df), chunk_size)]
+    if jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_score_chunk, chunks))
+    else:
+        results = [_score_chunk(chunk) for chunk in chunks]
+    return np.concatenate(results) if results else np.zeros((0, len(cuisines)), dtype=np.int16)
+
+
+def tag_cuisines(df, jobs=1, chunk_size=50000):
+    """Cuisine column for df, tagged in chunks of chunk_size rows across jobs processes."""
+    return choose_cuisines(df['Name'], score_recipes(df, jobs=jobs, chunk_size=chunk_size))
+
+
+def state_path(output):
+    return output + '.state.npz'
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_state(path):
+    """Saved scores of a previous run, or None."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as state:
+        return {
+            'source': str(state['source']),
+            'rules': json.loads(str(state['rules'])),
+            'columns': list(state['columns']),
+            'hashes': state['hashes'],
+            'scores': state['scores'],
+            'cuisines': list(state['cuisines']),
+            'tags': state['tags'],
+        }
+
+
+def save_state(path, source, rules, columns, hashes, scores, tags):
+    # Written to a temporary file first so an interrupted run never leaves a half-written state
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, source=source, rules=json.dumps(rules), columns=np.array(columns, dtype=str), hashes=hashes,
+             scores=scores, cuisines=np.array(CUISINE_NAMES, dtype=str), tags=np.array(tags, dtype=str))
+    os.replace(tmp_path, path)
+
+
+def update_scores(df, hashes, rules, state, jobs, chunk_size):
+    """
+    Score matrix for df reusing the saved one: rows whose content hash is known keep their scores for
+    every cuisine with unchanged rules; unknown rows are scored fully, changed cuisines for all rows.
+    """
+    scores = np.zeros((len(df), len(CUISINE_NAMES)), dtype=np.int16)
+    known = np.full(len(df), -1, dtype=np.int64)
+    stale_cuisines = list(CUISINE_NAMES)
+    if state is not None:
+        previous = pd.Index(state['hashes'])
+        unique = ~previous.duplicated()
+        positions = np.flatnonzero(unique)
+        matches = pd.Index(state['hashes'][unique]).get_indexer(hashes)
+        known = np.where(matches >= 0, positions[matches], -1)
+        stale_cuisines = [cuisine for cuisine in CUISINE_NAMES
+                          if cuisine not in state['cuisines'] or state['rules'].get(cuisine) != rules[cuisine]]
+        reused = np.flatnonzero(known >= 0)
+        for j, cuisine in enumerate(CUISINE_NAMES):
+            if cuisine not in stale_cuisines:
+                scores[reused, j] = state['scores'][known[reused], state['cuisines'].index(cuisine)]
+
+    new_rows = np.flatnonzero(known < 0)
+    print(f"Rescoring {len(new_rows)} new or changed recipes and {len(stale_cuisines)} changed cuisines")
+    if len(new_rows):
+        scores[new_rows] = score_recipes(df.iloc[new_rows], jobs=jobs, chunk_size=chunk_size)
+    if stale_cuisines and len(new_rows) < len(df):
+        old_rows = np.flatnonzero(known >= 0)
+        columns = [CUISINE_NAMES.index(cuisine) for cuisine in stale_cuisines]
+        scores[np.ix_(old_rows, columns)] = score_recipes(df.iloc[old_rows], stale_cuisines, jobs=jobs, chunk_size=chunk_size)
+    return scores
+
+
+def write_output(df, output, state, hashes, columns):
+    """
+    Write df to the gzipped output CSV. When the output already holds the first rows unchanged (same
+    content and tags) only the new rows are appended, as an extra gzip member; otherwise it is rewritten.
+    """
+    if state is not None and os.path.exists(output) and state['columns'] == columns:
+        n_old = len(state['hashes'])
+        if (n_old <= len(df) and np.array_equal(state['hashes'], hashes[:n_old])
+                and np.array_equal(state['tags'], df['Cuisine'].to_numpy(dtype=str)[:n_old])):
+            if n_old == len(df):
+                print("Output already up to date")
+            else:
+                df.iloc[n_old:].to_csv(output, mode='a', header=False, index=False, compression='gzip')
+                print(f"Appended {len(df) - n_old} recipes to {output}")
+            return
+    df.to_csv(output, index=False, compression='gzip')
+    print(f"Saved to {output}")
+
+
+def print_report(df):
+    # Show statistics
+    print("\n" + "="*80)
+    print("CUISINE DISTRIBUTION:")
+    print("="*80)
+    cuisine_counts = df['Cuisine'].value_counts()
+    print(cuisine_counts)
+
+    # Show examples for each cuisine
+    print("\n" + "="*80)
+    print("SAMPLE RECIPES BY CUISINE:")
+    print("="*80)
+    for cuisine in CUISINE_NAMES:
+        cuisine_recipes = df[df['Cuisine'] == cuisine]
+        if len(cuisine_recipes) > 0:
+            print(f"\n{cuisine} ({len(cuisine_recipes)} recipes):")
+            for name in cuisine_recipes['Name'].head(5):
+                print(f"  - {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--input', default='Data/dataset.csv', help='gzipped recipe CSV to tag')
+    parser.add_argument('--output', default='Data/dataset_enhanced.csv', help='gzipped CSV to write')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes for tagging')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='rows per tagging chunk')
+    parser.add_argument('--full', action='store_true', help='ignore the saved state and retag everything')
+    args = parser.parse_args()
+
+    rules = rules_hashes()
+    state = None if args.full or not os.path.exists(args.output) else load_state(state_path(args.output))
+    source = source_fingerprint(args.input)
+    if state is not None and state['source'] == source and state['rules'] == rules and state['cuisines'] == CUISINE_NAMES:
+        print(f"{args.output} is up to date with {args.input} and the cuisine rules, nothing to do.")
+        return
+
+    print("Loading dataset...")
+    df = pd.read_csv(args.input, compression='gzip')
+    print(f"Original dataset shape: {df.shape}")
+    columns = df.columns.tolist()
+    hashes = row_hashes(df)
+
+    print("\nDetecting cuisines...")
+    start = time.time()
+    scores = update_scores(df, hashes, rules, state, args.jobs, args.chunk_size)
+    df['Cuisine'] = choose_cuisines(df['Name'], scores)
+    print(f"Tagged {len(df)} recipes in {time.time() - start:.1f}s")
+
+    print_report(df)
+
+    # Save enhanced dataset
+    print("\n" + "="*80)
+    print("SAVING ENHANCED DATASET...")
+    print("="*80)
+    write_output(df, args.output, state, hashes, columns)
+    save_state(state_path(args.output), source, rules, columns, hashes, scores, df['Cuisine'].to_numpy(dtype=str))
+    print(f"Dataset now has {len(df.columns)} columns: {df.columns.tolist()}")
+    print(f"Total recipes: {len(df)}")
+    print("\nDone! Now update the code to use this enhanced dataset.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from dataset_store import NUTRITION_COLUMNS, RecipeStore
+
+
+def recipes():
+    frame = pd.DataFrame({'RecipeId': np.arange(5), 'Name': ["Soup", None, "Stew", "Salad", "Toast"]})
+    for i, name in enumerate(NUTRITION_COLUMNS):
+        frame[name] = np.arange(5, dtype=float) + i
+    frame['RecipeIngredientParts'] = ['c("water", "salt")', 'c()', None, 'c("lettuce")', 'c("bread", "butter")']
+    return frame
+
+
+def test_chunked_ingestion_matches_in_memory_store(tmp_path):
+    frame = recipes()
+    frame.to_csv(tmp_path / 'recipes.csv.gz', index=False, compression='gzip')
+    chunked = RecipeStore.build_from_csv(str(tmp_path / 'recipes.csv.gz'), str(tmp_path / 'chunked'), chunksize=2)
+    RecipeStore.from_dataframe(frame).save(str(tmp_path / 'saved'))
+    saved = RecipeStore.open(str(tmp_path / 'saved'))
+
+    for store in (chunked, saved):
+        assert store.column('Name').tolist()[0] == "Soup" and pd.isna(store.column('Name')[1])
+        assert store.column('RecipeIngredientParts').tolist() == [['water', 'salt'], [], [], ['lettuce'], ['bread', 'butter']]
+    assert not list(tmp_path.glob('*/*.tmp'))
@@ -0,0 +1,93 @@
+"""llm_chat answers that need no model: the worker client, the answer cache and the recipe fast path."""
+
+import json
+
+import pytest
+import requests
+
+import llm_chat
+
+CONTEXT = "1. Lentil Soup - 310 kcal"
+
+
+class FakeWorkerResponse:
+    def __init__(self, lines):
+        self.status_code = 200
+        self.lines = [json.dumps(line).encode() for line in lines]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+@pytest.fixture
+def worker_replies(monkeypatch):
+    """Serves each /chat request with the next list of NDJSON lines."""
+    replies = []
+    monkeypatch.setattr(llm_chat, 'LLM_WORKER_URL', 'http://worker')
+    monkeypatch.setattr(requests, 'post', lambda *args, **kwargs: FakeWorkerResponse(replies.pop(0)))
+    llm_chat.clear_answer_cache()
+    yield replies
+    llm_chat.clear_answer_cache()
+
+
+def ask(question="How long does it take?"):
+    stats = {}
+    answer = ''.join(llm_chat.stream_chat_answer(CONTEXT, "", question, stats))
+    return answer, stats
+
+
+def test_worker_answer_is_cached(worker_replies):
+    worker_replies.append([{'text': "About 40 minutes."},
+                           {'stats': {'ttft': 0.1, 'tokens': 5, 'tokens_per_sec': 20.0, 'total': 0.3}}])
+    answer, stats = ask()
+    assert (answer, stats['source']) == ("About 40 minutes.", 'model')
+    answer, stats = ask()
+    assert (answer, stats['source']) == ("About 40 minutes.", 'cache')
+
+
+@pytest.mark.parametrize('reply', [
+    [{'text': "Sorry, I encountered an error: boom. Please try again."},
+     {'stats': {'error': "boom", 'ttft': None, 'tokens': 0, 'tokens_per_sec': 0.0, 'total': 0.1}}],
+    [{'text': "About 40"}],  # the worker went away before its stats line
+])
+def test_failed_worker_answer_is_not_cached(worker_replies, reply):
+    worker_replies.append(reply)
+    worker_replies.append([{'text': "About 40 minutes."},
+                           {'stats': {'ttft': 0.1, 'tokens': 5, 'tokens_per_sec': 20.0, 'total': 0.3}}])
+    _, stats = ask()
+    assert 'error' in stats
+    assert llm_chat.format_stream_stats(stats) == ""
+    answer, stats = ask()
+    assert answer == "About 40 minutes."
+    assert stats['source'] == 'model'
+
+
+PEANUT_NOODLES = {'Name': "Peanut Noodles", 'RecipeIngredientParts': ["rice noodles", "peanut butter", "soy sauce"]}
+COCONUT_CURRY = {'Name': "Chickpea Curry", 'RecipeIngredientParts': ["chickpeas", "coconut milk", "curry powder"]}
+PANEER_CURRY = {'Name': "Paneer Curry", 'RecipeIngredientParts': ["paneer", "cream", "butter"]}
+
+
+@pytest.mark.parametrize('recipe', [PEANUT_NOODLES, COCONUT_CURRY])
+@pytest.mark.parametrize('diet', ['vegan', 'vegetarian'])
+def test_plant_based_compounds_are_not_animal_products(recipe, diet):
+    answer = llm_chat.answer_from_recipes([((), recipe)], f"Is it {diet}?")
+    assert answer.startswith(f"Yes, {recipe['Name']} looks {diet}")
+
+
+def test_dairy_recipe_is_not_vegan():
+    answer = llm_chat.answer_from_recipes([((), PANEER_CURRY)], "Is the paneer curry vegan?")
+    assert answer.startswith("No, Paneer Curry is not vegan: it contains butter, cream.")
+
+
+def test_hypothetical_diet_question_goes_to_the_model():
+    recipes = [(('Lunch',), COCONUT_CURRY), (('Dinner',), PANEER_CURRY)]
+    assert llm_chat.answer_from_recipes(recipes, "Can the curry be vegan?") is None
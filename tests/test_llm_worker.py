@@ -0,0 +1,76 @@
+"""InferenceWorker behaviour without a model: generate_local_batch is replaced per test."""
+
+import asyncio
+import json
+
+import llm_chat
+import llm_worker
+
+
+def make_request(message="Which recipe has the most protein?"):
+    return llm_worker.ChatRequest(context_text="1. Lentil Soup", user_message=message)
+
+
+def drain(job):
+    items = []
+    while True:
+        item = job.output.get(timeout=5)
+        if item is None:
+            return items
+        items.append(item)
+
+
+def test_failed_generation_sends_error_stats(monkeypatch):
+    def fail(questions, on_text):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(llm_chat, 'generate_local_batch', fail)
+    worker = llm_worker.InferenceWorker(max_batch=1)
+    job = worker.submit(make_request())
+    worker._answer(worker._collect(worker.jobs.get()))
+
+    text, stats = drain(job)
+    assert text['text'].startswith("Sorry")
+    assert stats['stats']['error'] == "out of memory"
+    assert stats['stats']['tokens'] == 0
+    assert worker.metrics()['failed'] == 1
+    assert llm_chat.format_stream_stats(stats['stats']) == ""
+
+
+class FakeRequest:
+    def __init__(self, disconnected):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+async def read_stream(job, request):
+    return [line async for line in job.stream(request)]
+
+
+def test_queued_job_of_disconnected_client_is_skipped(monkeypatch):
+    answered = []
+
+    def generate(questions, on_text):
+        answered.extend(message for _, _, message in questions)
+        for row in range(len(questions)):
+            on_text(row, "Lentil Soup")
+        return [{'ttft': 0.1, 'tokens': 2, 'tokens_per_sec': 10.0, 'total': 0.2} for _ in questions]
+
+    monkeypatch.setattr(llm_chat, 'generate_local_batch', generate)
+    worker = llm_worker.InferenceWorker(max_batch=1)
+    in_flight = worker.submit(make_request("first"))
+    queued = worker.submit(make_request("second"))
+    batch = worker._collect(worker.jobs.get())
+
+    # The second client leaves while the first question is still being answered
+    assert asyncio.run(read_stream(queued, FakeRequest(disconnected=True))) == []
+    assert queued.cancelled.is_set()
+    worker._answer(batch)
+    assert worker._collect(worker.jobs.get()) == []
+
+    assert answered == ["first"]
+    assert worker.metrics()['skipped'] == 1
+    lines = asyncio.run(read_stream(in_flight, FakeRequest(disconnected=False)))
+    assert json.loads(lines[-1])['stats']['batch_size'] == 1
@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset_store import NUTRITION_COLUMNS, RecipeStore
+from recipe_index import RecipeIndex
+
+
+def recipes(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.uniform(1, 100, size=(n_rows, len(NUTRITION_COLUMNS))), columns=NUTRITION_COLUMNS)
+    frame.insert(0, 'RecipeId', np.arange(n_rows))
+    frame.insert(1, 'Name', [f"Recipe {i}" for i in range(n_rows)])
+    frame['RecipeIngredientParts'] = ['c("rice", "beans")'] * n_rows
+    return frame
+
+
+def test_saved_arrays_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'store')
+    RecipeStore.from_dataframe(recipes(50, seed=0)).save(path)
+    built = RecipeIndex(RecipeStore.open(path))
+    reopened = RecipeIndex(RecipeStore.open(path))
+    assert isinstance(reopened.matrix, np.memmap)
+    np.testing.assert_array_equal(reopened.matrix, built.matrix)
+
+
+def test_rewritten_store_with_same_row_count_gets_new_vectors(tmp_path):
+    path = str(tmp_path / 'store')
+    RecipeStore.from_dataframe(recipes(50, seed=0)).save(path)
+    RecipeIndex(RecipeStore.open(path))
+
+    RecipeStore.from_dataframe(recipes(50, seed=1)).save(path)
+    store = RecipeStore.open(path)
+    index = RecipeIndex(store)
+    np.testing.assert_allclose(index.matrix, RecipeIndex.build_arrays(store)['unit_matrix'], rtol=1e-6)
+    # Only the arrays of the current build are left on disk
+    assert [entry for entry in os.listdir(path) if entry.startswith('index_')] == [f'index_{store.fingerprint()}']
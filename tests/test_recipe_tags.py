@@ -0,0 +1,12 @@
+import numpy as np
+
+from recipe_tags import DIET_BITS, diet_bits, tag_mask
+
+
+def test_plant_based_compounds_keep_recipes_vegan():
+    bits = diet_bits(["Peanut Noodles", "Chickpea Curry", "Roasted Eggplant", "Cheese Toast"],
+                     [["peanut butter", "soy milk"], ["coconut milk"], ["eggplant", "olive oil"], ["bread", "butter"]])
+    assert bits[3] & DIET_BITS['dairy']
+    assert not (bits[:3] & (DIET_BITS['dairy'] | DIET_BITS['egg'])).any()
+    mask = tag_mask(bits, np.zeros(len(bits), dtype=np.uint16), dietary_restrictions=['Vegan'])
+    assert mask.tolist() == [True, True, True, False]